@@ -1,65 +1,327 @@
+import gzip
+import tempfile
 import streamlit as st
 import pandas as pd
-import psycopg2
+import pyarrow as pa
+import pyarrow.parquet as pq
 from datetime import datetime, timedelta
-import os
 from dotenv import load_dotenv
 
+from db import get_engine, raw_connection
+
 # Load environment variables
 load_dotenv()
 
-# Database connection parameters
-DB_PARAMS = {
-    "dbname": os.getenv("PG_DATABASE_APP"),
-    "user": os.getenv("PG_USER"),
-    "password": os.getenv("PG_PASSWORD"),
-    "host": os.getenv("PG_HOST"),
-    "port": os.getenv("PG_PORT"),
+# Source filter applied for each choice of the source dropdown
+SOURCE_FILTERS = {
+    "Amazon": "source = 'amazon'",
+    "Social Media": "source in ('tiktok', 'instagram')",
+    "All": "source IS NOT NULL",
 }
 
+# Detail rows fetched per page
+PAGE_SIZE = 500
+
+# Queries listed in the top queries table
+TOP_QUERIES = 20
+
+# Export formats offered for download, as (file extension, MIME type)
+EXPORT_FORMATS = {
+    "CSV": ("csv.gz", "application/gzip"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+EXPORT_COLUMNS = ["query", "source", "ip", "queried_at"]
+
+# Rows fetched from the server-side cursor per export chunk
+EXPORT_CHUNK_SIZE = 50_000
+
+# Seconds query results are cached, ranges ending before today cannot change
+RECENT_RANGE_TTL = 5 * 60
+CLOSED_RANGE_TTL = 24 * 60 * 60
+
+# Query results kept in each cache
+CACHE_MAX_ENTRIES = 256
 
 
-def connect_to_db():
-    """Establish connection to PostgreSQL database"""
+def read_sql(query, params):
+    """Run a query on a pooled connection and return the result as a DataFrame"""
+    with get_engine("app").connect() as conn:
+        return pd.read_sql_query(query, conn, params=params)
+
+
+@st.cache_data(ttl=RECENT_RANGE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def read_sql_recent(query, params):
+    """Cached read_sql for ranges that include today"""
+    return read_sql(query, params)
+
+
+@st.cache_data(ttl=CLOSED_RANGE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def read_sql_closed(query, params):
+    """Cached read_sql for ranges that ended before today"""
+    return read_sql(query, params)
+
+
+def run_query(query, params, end_date):
+    """Run a query through the cache matching its range and return a DataFrame"""
+    closed = end_date < datetime.combine(datetime.now().date(), datetime.min.time())
     try:
-        conn = psycopg2.connect(**DB_PARAMS)
-        return conn
+        if closed:
+            return read_sql_closed(query, params)
+        return read_sql_recent(query, params)
     except Exception as e:
-        st.error(f"Database connection error: {e}")
-        return None
+        st.error(f"Query error: {e}")
+        return pd.DataFrame()
 
 
-def query_sentiment_data(start_date, end_date, source):
-    """Query sentiment analysis data from the database"""
-    conn = connect_to_db()
-    if not conn:
-        return pd.DataFrame()
+@st.cache_data(ttl=RECENT_RANGE_TTL, show_spinner=False)
+def refresh_rollup():
+    """Roll raw rows of complete days up into trends.analytics_daily
+
+    The last rolled up day is recomputed to pick up late rows, older days are
+    never touched again. Returns the number of rollup rows written.
+    """
+    with raw_connection("app") as conn:
+        with conn.cursor() as cursor:
+            # Serialize refreshes from several app processes, reads still go on
+            cursor.execute(
+                "LOCK TABLE trends.analytics_daily IN SHARE ROW EXCLUSIVE MODE"
+            )
+            cursor.execute(
+                """
+                    SELECT coalesce(max(day), '-infinity'::date)
+                    FROM trends.analytics_daily
+                """
+            )
+            since = cursor.fetchone()[0]
+            cursor.execute(
+                "DELETE FROM trends.analytics_daily WHERE day >= %s", (since,)
+            )
+            cursor.execute(
+                """
+                    INSERT INTO trends.analytics_daily (source, day, query, queries)
+                    SELECT source, queried_at::date, query, count(*)
+                    FROM trends.analytics
+                    WHERE queried_at >= %s AND queried_at < current_date
+                    GROUP BY 1, 2, 3
+                """,
+                (since,),
+            )
+            written = cursor.rowcount
+        conn.commit()
+        return written
+
 
-    if source == "Amazon":
-        subquery = "source = 'amazon'"
-    elif source == "Social Media":
-        subquery = "source in ('tiktok', 'instagram')"
-    else:
-        subquery = "source IS NOT NULL"
+def query_summary(start_date, end_date, source):
+    """Aggregate the date range in SQL: counts per source, per day and top queries
 
+    Complete days are read from the daily rollup, only the days after the
+    last rolled up day are counted from raw rows.
+    """
     try:
-        query = f"""
-            SELECT query, source, ip, queried_at FROM trends.analytics
-            WHERE {subquery} AND queried_at BETWEEN %s AND %s
-            ORDER BY queried_at DESC
-        """
+        refresh_rollup()
+    except Exception as e:
+        st.error(f"Rollup refresh error: {e}")
 
-        df = pd.read_sql_query(
-            query,
-            conn,
-            params=(start_date, end_date),
+    counts = f"""
+        WITH watermark AS (
+            SELECT coalesce(max(day) + 1, '-infinity'::date) AS day
+            FROM trends.analytics_daily
+        ),
+        counts AS (
+            SELECT source, day, query, queries FROM trends.analytics_daily
+            WHERE {SOURCE_FILTERS[source]}
+                AND day BETWEEN %s::date AND %s::date
+                AND day < (SELECT day FROM watermark)
+            UNION ALL
+            SELECT source, queried_at::date, query, count(*) FROM trends.analytics
+            WHERE {SOURCE_FILTERS[source]}
+                AND queried_at BETWEEN %s AND %s
+                AND queried_at >= (SELECT day FROM watermark)
+            GROUP BY 1, 2, 3
         )
-        return df
-    except Exception as e:
-        st.error(f"Query error: {e}")
-        return pd.DataFrame()
+    """
+    params = (start_date, end_date) * 2
+
+    by_source = run_query(
+        counts
+        + """
+            SELECT source, sum(queries)::bigint AS queries FROM counts
+            GROUP BY source
+            ORDER BY queries DESC
+        """,
+        params,
+        end_date,
+    )
+    by_day = run_query(
+        counts
+        + """
+            SELECT day, sum(queries)::bigint AS queries FROM counts
+            GROUP BY day
+            ORDER BY day
+        """,
+        params,
+        end_date,
+    )
+    top_queries = run_query(
+        counts
+        + """
+            SELECT query, sum(queries)::bigint AS queries FROM counts
+            GROUP BY query
+            ORDER BY queries DESC
+            LIMIT %s
+        """,
+        params + (TOP_QUERIES,),
+        end_date,
+    )
+    return by_source, by_day, top_queries
+
+
+def query_sentiment_page(start_date, end_date, source, before=None, page_size=PAGE_SIZE):
+    """Query one page of detail rows, newest first, older than the `before` cursor
+
+    Rows sharing the last timestamp of the page are included so the next page
+    can start strictly before it without skipping any row.
+    """
+    where = f"{SOURCE_FILTERS[source]} AND queried_at BETWEEN %s AND %s"
+    params = (start_date, end_date)
+    if before is not None:
+        where += " AND queried_at < %s"
+        params += (before,)
+
+    query = f"""
+        WITH page AS (
+            SELECT queried_at FROM trends.analytics
+            WHERE {where}
+            ORDER BY queried_at DESC
+            LIMIT %s
+        )
+        SELECT query, source, ip, queried_at FROM trends.analytics
+        WHERE {where} AND queried_at >= (SELECT min(queried_at) FROM page)
+        ORDER BY queried_at DESC
+    """
+    return run_query(query, params + (page_size,) + params, end_date)
+
+
+def iter_export_chunks(start_date, end_date, source, chunk_size=EXPORT_CHUNK_SIZE):
+    """Stream the detail rows of a range from a server-side cursor in DataFrames"""
+    with raw_connection("app") as conn:
+        # A named cursor keeps the result on the server, only one chunk is
+        # held in memory at a time
+        with conn.cursor(name="export") as cursor:
+            cursor.itersize = chunk_size
+            cursor.execute(
+                f"""
+                    SELECT query, source, ip, queried_at FROM trends.analytics
+                    WHERE {SOURCE_FILTERS[source]} AND queried_at BETWEEN %s AND %s
+                    ORDER BY queried_at DESC
+                """,
+                (start_date, end_date),
+            )
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield pd.DataFrame.from_records(rows, columns=EXPORT_COLUMNS)
+
+
+def write_export(chunks, file, extension):
+    """Write DataFrame chunks to an open binary file as gzipped CSV or Parquet"""
+    if extension == "csv.gz":
+        with gzip.open(file, "wt", newline="") as f:
+            header = True
+            for chunk in chunks:
+                chunk.to_csv(f, index=False, header=header)
+                header = False
+        return
+
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                # Columns that are all NULL in the first chunk are text
+                schema = pa.schema(
+                    [
+                        field.with_type(pa.string())
+                        if pa.types.is_null(field.type)
+                        else field
+                        for field in table.schema
+                    ]
+                )
+                writer = pq.ParquetWriter(file, schema, compression="zstd")
+            writer.write_table(table.cast(schema))
     finally:
-        conn.close()
+        if writer is not None:
+            writer.close()
+
+
+def export_file(start_date, end_date, source, extension):
+    """Export the detail rows of a range to a temporary file and return it"""
+    file = tempfile.TemporaryFile()
+    write_export(iter_export_chunks(start_date, end_date, source), file, extension)
+    file.seek(0)
+    return file
+
+
+def show_summary(start_date, end_date, source):
+    """Render the SQL aggregates of the selected range"""
+    by_source, by_day, top_queries = query_summary(start_date, end_date, source)
+    total = int(by_source["queries"].sum()) if not by_source.empty else 0
+    if not total:
+        st.warning("No data found for the selected date range.")
+        return False
+
+    st.success(f"Query successful! Found {total} records.")
+    st.subheader("Queries per Day")
+    st.bar_chart(by_day, x="day", y="queries")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("Queries per Source")
+        st.dataframe(by_source, hide_index=True)
+    with col2:
+        st.subheader("Top Queries")
+        st.dataframe(top_queries, hide_index=True)
+    return True
+
+
+def show_details(start_date, end_date, source):
+    """Render detail rows one page at a time, loaded only on demand"""
+    st.subheader("Sentiment Analysis Results")
+    if not st.toggle("Show detail rows"):
+        return
+
+    # Cursor of every page visited so far, the last one is the current page
+    cursors = st.session_state.setdefault("cursors", [None])
+    df = query_sentiment_page(start_date, end_date, source, before=cursors[-1])
+
+    st.write(f"Page {len(cursors)}")
+    st.dataframe(df, hide_index=True)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Previous page", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+    with col2:
+        if st.button("Next page", disabled=len(df) < PAGE_SIZE):
+            cursors.append(df["queried_at"].min())
+            st.rerun()
+
+
+def show_export(start_date, end_date, source):
+    """Render the download of every row of the range, built only when clicked"""
+    st.subheader("Export")
+    fmt = st.radio("Format", list(EXPORT_FORMATS), horizontal=True)
+    extension, mime = EXPORT_FORMATS[fmt]
+    st.download_button(
+        label=f"Download as {fmt}",
+        data=lambda: export_file(start_date, end_date, source, extension),
+        file_name=f"sentiment_analysis_{start_date:%Y-%m-%d}_to_{end_date:%Y-%m-%d}"
+        f".{extension}",
+        mime=mime,
+        on_click="ignore",
+    )
 
 
 def main():
@@ -91,28 +353,19 @@ def main():
     st.write(f"Selected date range: **{start_date}** to **{end_date}**")
     st.write(f"Selected source: **{source}**")
 
-    # Query button
+    # Query button, the selection is kept in the session so paging reruns it
+    params = (start_datetime, end_datetime, source)
     if st.button("Run Query"):
-        with st.spinner("Querying database..."):
-            df = query_sentiment_data(start_datetime, end_datetime, source)
-
-            if not df.empty:
-                st.success(f"Query successful! Found {len(df)} records.")
-
-                # Display data
-                st.subheader("Sentiment Analysis Results")
-                st.dataframe(df, hide_index=True)
-
-                # Export to CSV
-                csv = df.to_csv(index=False)
-                st.download_button(
-                    label="Download as CSV",
-                    data=csv,
-                    file_name=f"sentiment_analysis_{start_date}_to_{end_date}.csv",
-                    mime="text/csv",
-                )
-            else:
-                st.warning("No data found for the selected date range.")
+        st.session_state["params"] = params
+        st.session_state["cursors"] = [None]
+    if st.session_state.get("params") != params:
+        return
+
+    with st.spinner("Querying database..."):
+        found = show_summary(*params)
+    if found:
+        show_details(*params)
+        show_export(*params)
 
 
 if __name__ == "__main__":
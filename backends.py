@@ -0,0 +1,902 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Tuple
+
+import duckdb
+import psycopg2
+import pyarrow as pa
+import requests
+from dotenv import load_dotenv
+from junglescout import ClientSync
+from junglescout.models.parameters import ApiType, Marketplace
+from neo4j import GraphDatabase
+
+from db import get_engine
+
+load_dotenv()
+
+# "live" talks to Postgres, Neo4j, SellerApp and JungleScout, "local" to the
+# stand-ins below so the pipeline runs offline
+BACKEND = os.getenv("PIPELINE_BACKEND", "live")
+
+# Folder holding the local databases and recorded responses
+LOCAL_DIR = os.getenv("LOCAL_BACKEND_DIR", "data/local")
+
+# Delay added to every stubbed API call, in milliseconds
+LOCAL_LATENCY_MS = float(os.getenv("LOCAL_LATENCY_MS", "0"))
+
+# Set to 1 with the local backend to fetch unrecorded SellerApp responses
+# from the live API and add them to the recording
+SELLERAPP_RECORD = os.getenv("SELLERAPP_RECORD", "0") == "1"
+
+# Tables the pipeline writes to, created in each local database
+POSTGRES_TABLES = {
+    "default": """
+        CREATE SCHEMA IF NOT EXISTS amz;
+        CREATE SCHEMA IF NOT EXISTS raw;
+        CREATE TABLE IF NOT EXISTS amz.bestsellers (
+            category_id VARCHAR,
+            market VARCHAR,
+            category VARCHAR,
+            category_path VARCHAR,
+            url VARCHAR,
+            updated_at TIMESTAMP,
+            PRIMARY KEY (category_id, market)
+        );
+        CREATE TABLE IF NOT EXISTS raw.amazon_bestsellers (
+            category VARCHAR,
+            asin VARCHAR
+        );
+        CREATE TABLE IF NOT EXISTS raw.amazon_products (
+            asin VARCHAR PRIMARY KEY,
+            est_mly_units_sold NUMERIC,
+            est_avg_dly_units_sold NUMERIC
+        );
+    """,
+    "app": "CREATE SCHEMA IF NOT EXISTS public;",
+}
+
+# Database and tables read by each process.py source query, replaced on
+# seeding from the seed_ids relation
+SOURCE_TABLES = {
+    "amazon": (
+        "default",
+        """
+        CREATE OR REPLACE TABLE amz.products (asin VARCHAR);
+        CREATE OR REPLACE TABLE amz.bestsellers_products (
+            bestseller_id BIGINT,
+            product_asin VARCHAR
+        );
+        INSERT INTO amz.products SELECT id FROM seed_ids;
+        INSERT INTO amz.bestsellers_products SELECT 0, id FROM seed_ids;
+        """,
+    ),
+    "shopee": (
+        "default",
+        """
+        CREATE SCHEMA IF NOT EXISTS tmapi_shopee;
+        CREATE OR REPLACE TABLE tmapi_shopee.normalized_shopee_product_details (
+            item_id BIGINT
+        );
+        INSERT INTO tmapi_shopee.normalized_shopee_product_details
+        SELECT id FROM seed_ids;
+        """,
+    ),
+    "supply": (
+        "app",
+        """
+        CREATE OR REPLACE TABLE public.products (product_id BIGINT);
+        INSERT INTO public.products SELECT id FROM seed_ids;
+        """,
+    ),
+}
+
+ARROW_TYPES = {"VARCHAR": pa.string(), "BIGINT": pa.int64()}
+
+# psycopg2 placeholders and escaped percent signs
+PLACEHOLDER = re.compile(r"%\((\w+)\)s|%s|%%")
+
+COPY_FROM_STDIN = re.compile(r"COPY\s+([\w.]+)\s*\(([^)]*)\)\s+FROM\s+STDIN", re.I)
+COPY_TO_STDOUT = re.compile(
+    r"COPY\s+\((.*)\)\s+TO\s+STDOUT(?:\s+WITH\s*\((.*)\))?\s*$", re.I | re.S
+)
+ON_COMMIT_DROP = re.compile(
+    r"(CREATE\s+TEMP(?:ORARY)?\s+TABLE\s+(\w+).*?)\s+ON\s+COMMIT\s+DROP", re.I | re.S
+)
+
+
+def is_local() -> bool:
+    """
+    Check whether the pipeline runs against the local stand-in backends
+    """
+    return BACKEND == "local"
+
+
+def sql_literal(value: Any) -> str:
+    """
+    Quote a Python value as a SQL literal, like psycopg2's mogrify
+    """
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, float, Decimal)):
+        return str(value)
+    if isinstance(value, (date, datetime)):
+        value = value.isoformat()
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+class LocalCursor:
+    """
+    psycopg2 cursor stand-in running the pipeline's queries on DuckDB
+    """
+
+    def __init__(self, connection: "LocalConnection", name: str = None):
+        self.connection = connection
+        self.name = name
+        self.itersize = 2000
+
+    def execute(self, query, params=None):
+        """
+        Run a query with psycopg2 placeholders (%s, %(name)s) in the connection's
+        transaction
+        """
+        if isinstance(query, bytes):
+            query = query.decode()
+        if params is not None:
+            query, params = self.bind(query, params)
+        match = ON_COMMIT_DROP.search(query)
+        if match:
+            # DuckDB only keeps temp tables for the session, drop them on commit
+            query = query.replace(match[0], match[1])
+            self.connection.on_commit_drop.append(match[2])
+        self.connection.begin()
+        self.connection.conn.execute(query, params)
+
+    def bind(self, query: str, params) -> Tuple[str, Any]:
+        """
+        Translate psycopg2 placeholders to DuckDB ones, keeping the used parameters
+        """
+        names = []
+
+        def placeholder(match):
+            if match[0] == "%%":
+                return "%"
+            if match[1]:
+                names.append(match[1])
+                return f"${match[1]}"
+            return "?"
+
+        query = PLACEHOLDER.sub(placeholder, query)
+        if isinstance(params, dict):
+            params = {name: params[name] for name in names}
+        return query, params
+
+    def mogrify(self, template, args) -> bytes:
+        """
+        Fill a template's placeholders with quoted values, used by execute_values
+        """
+        if isinstance(template, bytes):
+            template = template.decode()
+        values = iter(args)
+
+        def placeholder(match):
+            if match[0] == "%%":
+                return "%"
+            return sql_literal(args[match[1]] if match[1] else next(values))
+
+        return PLACEHOLDER.sub(placeholder, template).encode()
+
+    def copy_expert(self, query: str, file):
+        """
+        Run COPY ... FROM STDIN or COPY (...) TO STDOUT in CSV format
+        """
+        self.connection.begin()
+        conn = self.connection.conn
+        match = COPY_FROM_STDIN.match(query.strip())
+        if match:
+            columns = [column.strip() for column in match[2].split(",")]
+            rows = list(csv.reader(file))
+            table = pa.table(
+                [pa.array([row[i] for row in rows], pa.string()) for i in range(len(columns))],
+                names=columns,
+            )
+            conn.register("copy_rows", table)
+            try:
+                conn.execute(f"INSERT INTO {match[1]} ({match[2]}) SELECT * FROM copy_rows")
+            finally:
+                conn.unregister("copy_rows")
+            return
+
+        match = COPY_TO_STDOUT.match(query.strip())
+        if not match:
+            raise ValueError(f"Unsupported COPY for the local database: {query}")
+        conn.execute(match[1])
+        writer = csv.writer(file)
+        if "HEADER" in (match[2] or "").upper():
+            writer.writerow([column[0] for column in conn.description])
+        while True:
+            rows = conn.fetchmany(self.itersize)
+            if not rows:
+                break
+            writer.writerows(rows)
+
+    @property
+    def description(self):
+        return self.connection.conn.description
+
+    def fetchone(self):
+        return self.connection.conn.fetchone()
+
+    def fetchmany(self, size: int = None):
+        return self.connection.conn.fetchmany(size or self.itersize)
+
+    def fetchall(self):
+        return self.connection.conn.fetchall()
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class LocalConnection:
+    """
+    psycopg2 connection stand-in on a DuckDB connection
+
+    Like psycopg2, the first query opens a transaction that lasts until
+    commit or rollback.
+    """
+
+    # Read by execute_values to encode its queries
+    encoding = "UTF8"
+
+    def __init__(self, conn: duckdb.DuckDBPyConnection):
+        self.conn = conn
+        self.in_transaction = False
+        self.on_commit_drop = []
+
+    def cursor(self, name: str = None) -> LocalCursor:
+        return LocalCursor(self, name)
+
+    def begin(self):
+        if not self.in_transaction:
+            self.conn.execute("BEGIN TRANSACTION")
+            self.in_transaction = True
+
+    def commit(self):
+        if self.in_transaction:
+            for table in self.on_commit_drop:
+                self.conn.execute(f"DROP TABLE IF EXISTS {table}")
+            self.conn.execute("COMMIT")
+        self.in_transaction = False
+        self.on_commit_drop = []
+
+    def rollback(self):
+        if self.in_transaction:
+            self.conn.execute("ROLLBACK")
+        self.in_transaction = False
+        self.on_commit_drop = []
+
+    def close(self):
+        self.rollback()
+        self.conn.close()
+
+
+class LocalPostgres:
+    """
+    DuckDB stand-in for a Postgres database, with the schemas and tables the
+    pipeline reads and writes
+    """
+
+    def __init__(self, database: str = "default", path: str = None):
+        """
+        Open or create the local database
+
+        Args:
+            database: Database name, as passed to db.get_engine
+            path: Path of the DuckDB file (default: postgres.duckdb, or
+                postgres_<database>.duckdb for other databases, in LOCAL_DIR)
+        """
+        name = "postgres" if database == "default" else f"postgres_{database}"
+        path = path or os.path.join(LOCAL_DIR, f"{name}.duckdb")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = duckdb.connect(path)
+        self.conn.execute(POSTGRES_TABLES[database])
+
+    def connect(self) -> LocalConnection:
+        """
+        Open a new connection, each with its own transactions
+        """
+        with self.lock:
+            return LocalConnection(self.conn.cursor())
+
+    def seed_ids(self, source: str, ids: Iterable, id_type: str = "VARCHAR") -> int:
+        """
+        Replace the tables read by a source's process.py query
+
+        Args:
+            source: Data source name
+            ids: Product IDs
+            id_type: DuckDB type of the IDs (VARCHAR or BIGINT)
+
+        Returns:
+            Number of IDs stored
+        """
+        table = pa.table({"id": pa.array(list(ids), ARROW_TYPES[id_type])})
+        with self.lock:
+            self.conn.register("seed_ids", table)
+            try:
+                self.conn.execute(SOURCE_TABLES[source][1])
+            finally:
+                self.conn.unregister("seed_ids")
+        return table.num_rows
+
+    def seed_category_asins(self, category: str, asins: Iterable[str]) -> int:
+        """
+        Add bestseller ASINs of a category, with a products row for each
+
+        Args:
+            category: Bestseller category name
+            asins: ASINs listed in the category
+
+        Returns:
+            Number of ASINs added
+        """
+        asins = list(asins)
+        with self.lock:
+            self.conn.executemany(
+                "INSERT INTO raw.amazon_bestsellers VALUES (?, ?)",
+                [(category, asin) for asin in asins],
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO raw.amazon_products (asin) VALUES (?)",
+                [(asin,) for asin in asins],
+            )
+        return len(asins)
+
+    def close(self):
+        self.conn.close()
+
+
+# Cypher subset answered by LocalGraph: one labelled node with optional
+# WHERE, RETURN with implicit grouping, ORDER BY and LIMIT
+CYPHER_QUERY = re.compile(
+    r"MATCH \(n:(?P<label>\w+)\)(?: WHERE (?P<where>.+?))? RETURN (?P<returns>.+?)"
+    r"(?: ORDER BY (?P<order>.+?))?(?: LIMIT (?P<limit>.+))?$",
+    re.I,
+)
+AGGREGATE = re.compile(r"\b(?:count|sum|min|max|avg)\s*\(", re.I)
+
+
+def split_items(text: str) -> List[str]:
+    """
+    Split a comma separated list, ignoring commas inside parentheses
+    """
+    items, depth, start = [], 0, 0
+    for i, char in enumerate(text):
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        if char == "," and depth == 0:
+            items.append(text[start:i].strip())
+            start = i + 1
+    items.append(text[start:].strip())
+    return items
+
+
+def cypher_to_sql(query: str, params: Dict[str, Any]) -> Tuple[str, str]:
+    """
+    Translate a Cypher query on one node label to SQL on the nodes table
+
+    Every node property is the node ID, list parameters are bound as JSON and
+    left(), a keyword in SQLite, is called as cypher_left().
+
+    Returns:
+        The (label, SQL query) pair
+    """
+    match = CYPHER_QUERY.match(" ".join(query.split()))
+    if not match:
+        raise ValueError(f"Unsupported Cypher for the local graph: {query}")
+
+    def expression(text):
+        text = re.sub(r"\bn\.\w+", "n.id", text)
+        text = re.sub(r"\bleft\s*\(", "cypher_left(", text, flags=re.I)
+        return re.sub(
+            r"\$(\w+)",
+            lambda m: (
+                f"(SELECT value FROM json_each(:{m[1]}))"
+                if isinstance(params.get(m[1]), list)
+                else f":{m[1]}"
+            ),
+            text,
+        )
+
+    returns = [expression(item) for item in split_items(match["returns"])]
+    sql = f"SELECT {', '.join(returns)} FROM nodes n WHERE n.label = :_label"
+    if match["where"]:
+        sql += f" AND ({expression(match['where'])})"
+    grouped = [
+        re.split(r"\s+AS\s+", item, flags=re.I)[0]
+        for item in returns
+        if not AGGREGATE.search(item)
+    ]
+    if grouped and len(grouped) < len(returns):
+        sql += f" GROUP BY {', '.join(grouped)}"
+    if match["order"]:
+        sql += f" ORDER BY {expression(match['order'])}"
+    if match["limit"]:
+        sql += f" LIMIT {expression(match['limit'])}"
+    return match["label"], sql
+
+
+class LocalResult:
+    """
+    Neo4j result stand-in over the fetched records
+    """
+
+    def __init__(self, records: List[sqlite3.Row]):
+        self.records = records
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def single(self):
+        return self.records[0] if self.records else None
+
+
+class LocalSession:
+    """
+    Neo4j session stand-in running queries on a LocalGraph
+    """
+
+    def __init__(self, graph: "LocalGraph"):
+        self.graph = graph
+
+    def run(self, query: str, parameters: Dict[str, Any] = None, **kwargs) -> LocalResult:
+        return self.graph.run(query, {**(parameters or {}), **kwargs})
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class LocalGraph:
+    """
+    SQLite stand-in for the Neo4j driver, one row per (label, ID) node
+
+    Sessions answer the pipeline's Cypher queries, see cypher_to_sql.
+    """
+
+    def __init__(self, path: str = None):
+        """
+        Open or create the local graph
+
+        Args:
+            path: Path of the SQLite file (default: graph.sqlite in LOCAL_DIR)
+        """
+        path = path or os.path.join(LOCAL_DIR, "graph.sqlite")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.create_function(
+            "cypher_left", 2, lambda text, size: None if text is None else text[:size]
+        )
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS nodes (
+                label TEXT NOT NULL,
+                id NOT NULL,
+                PRIMARY KEY (label, id)
+            ) WITHOUT ROWID
+            """
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS labels (label TEXT PRIMARY KEY)")
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO labels SELECT DISTINCT label FROM nodes"
+            )
+
+    def seed(self, label: str, ids: Iterable) -> int:
+        """
+        Replace the node IDs of a label
+
+        Args:
+            label: Node label
+            ids: ID property of every node
+
+        Returns:
+            Number of nodes stored
+        """
+        rows = [(label, id) for id in ids]
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM nodes WHERE label = ?", (label,))
+            self.conn.executemany("INSERT OR IGNORE INTO nodes VALUES (?, ?)", rows)
+            self.conn.execute("INSERT OR IGNORE INTO labels VALUES (?)", (label,))
+        return len(rows)
+
+    def session(self, **kwargs) -> LocalSession:
+        return LocalSession(self)
+
+    def run(self, query: str, params: Dict[str, Any]) -> LocalResult:
+        """
+        Run a Cypher query, see cypher_to_sql for the supported subset
+
+        Labels that were never seeded raise, like the tables missing from the
+        local Postgres, instead of answering as if they had no nodes.
+
+        Args:
+            query: Cypher query
+            params: Query parameters
+
+        Returns:
+            Result holding every record
+        """
+        label, sql = cypher_to_sql(query, params)
+        with self.lock:
+            seeded = self.conn.execute(
+                "SELECT 1 FROM labels WHERE label = ?", (label,)
+            ).fetchone()
+        if not seeded:
+            raise LookupError(f"Label {label} is not seeded in the local graph")
+        params = {
+            name: json.dumps(value) if isinstance(value, list) else value
+            for name, value in params.items()
+        }
+        with self.lock:
+            return LocalResult(self.conn.execute(sql, {**params, "_label": label}).fetchall())
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class StubResponse:
+    """
+    Minimal requests.Response stand-in returned by RecordedSession
+    """
+
+    def __init__(self, status_code: int, body: Any, headers: Dict[str, str] = None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+
+    def json(self) -> Any:
+        return self.body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error", response=self)
+
+
+class RecordedSession:
+    """
+    requests.Session stand-in replaying recorded SellerApp category_tree responses
+
+    Responses are kept in a JSON file mapping each parent category ID to its
+    child list. Unrecorded IDs are answered with an empty list, a leaf. With
+    an upstream session, unrecorded IDs are fetched from the live API and
+    added to the recording instead.
+    """
+
+    def __init__(
+        self,
+        path: str = None,
+        latency_ms: float = None,
+        upstream: requests.Session = None,
+    ):
+        """
+        Load the recorded responses
+
+        Args:
+            path: Recording file (default: sellerapp.json in LOCAL_DIR)
+            latency_ms: Delay added to every request (default: LOCAL_LATENCY_MS)
+            upstream: Live session used to record missing responses
+        """
+        self.path = path or os.path.join(LOCAL_DIR, "sellerapp.json")
+        self.latency = (LOCAL_LATENCY_MS if latency_ms is None else latency_ms) / 1000
+        self.upstream = upstream
+        self.headers = upstream.headers if upstream else requests.Session().headers
+        self.lock = threading.Lock()
+        self.responses = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.responses = json.load(f)
+
+    def mount(self, prefix, adapter):
+        if self.upstream:
+            self.upstream.mount(prefix, adapter)
+
+    def get(self, url: str, params: Dict[str, Any] = None, **kwargs) -> StubResponse:
+        """
+        Answer a category_tree request from the recording
+
+        Args:
+            url: The category_tree endpoint
+            params: Request parameters, the parent ID is the "key" parameter
+
+        Returns:
+            Recorded response
+        """
+        time.sleep(self.latency)
+        key = str((params or {}).get("key"))
+        with self.lock:
+            if key in self.responses:
+                return StubResponse(200, self.responses[key])
+        if not self.upstream:
+            return StubResponse(200, [])
+
+        response = self.upstream.get(url, params=params, **kwargs)
+        if response.status_code == 200:
+            with self.lock:
+                self.responses[key] = response.json()
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "w") as f:
+                    json.dump(self.responses, f)
+        return response
+
+
+class StubSalesEstimates:
+    """
+    Sales estimates response stand-in, exposing model_dump like the client models
+    """
+
+    def __init__(self, data: Dict[str, Any]):
+        self.data = data
+
+    def model_dump(self) -> Dict[str, Any]:
+        return json.loads(json.dumps(self.data))
+
+
+class RecordedJungleScoutClient:
+    """
+    JungleScout ClientSync stand-in replaying recorded sales estimates
+
+    Recordings are sales_estimates responses stored as {asin}.json, like the
+    files written to data/junglescout, in a folder of their own so runs never
+    rewrite what the next run replays. Each call returns the recorded days of
+    the requested window. ASINs without a recording get a deterministic
+    synthetic series so load tests can use any ASIN list.
+    """
+
+    # The live client logs in when its session is first used
+    session = None
+
+    def __init__(self, directory: str = None, latency_ms: float = None):
+        """
+        Args:
+            directory: Folder holding the recorded {asin}.json responses
+                (default: junglescout in LOCAL_DIR)
+            latency_ms: Delay added to every request (default: LOCAL_LATENCY_MS)
+        """
+        self.directory = directory or os.path.join(LOCAL_DIR, "junglescout")
+        self.latency = (LOCAL_LATENCY_MS if latency_ms is None else latency_ms) / 1000
+
+    @lru_cache(maxsize=None)
+    def recorded_days(self, asin: str) -> Dict[str, Dict[str, Any]]:
+        path = os.path.join(self.directory, f"{asin}.json")
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return None
+        with open(path) as f:
+            data = json.load(f)
+        return {
+            item["date"]: item
+            for result in data.get("data") or []
+            for item in result.get("attributes", {}).get("data", [])
+        }
+
+    def sales_estimates(
+        self, asin: str, start_date: str, end_date: str, **kwargs
+    ) -> StubSalesEstimates:
+        """
+        Return the recorded or synthetic daily sales of an ASIN for a window
+
+        Args:
+            asin: The product ASIN
+            start_date: First date of the window
+            end_date: Last date of the window
+
+        Returns:
+            Response with a model_dump method
+        """
+        time.sleep(self.latency)
+        recorded = self.recorded_days(asin)
+        day = date.fromisoformat(str(start_date))
+        last = date.fromisoformat(str(end_date))
+
+        items = []
+        while day <= last:
+            if recorded is None:
+                seed = hashlib.sha256(f"{asin}{day}".encode()).digest()
+                items.append(
+                    {
+                        "date": day.isoformat(),
+                        "estimated_units_sold": seed[0] % 10,
+                        "last_known_price": 10 + seed[1] % 90 + 0.99,
+                    }
+                )
+            elif day.isoformat() in recorded:
+                items.append(recorded[day.isoformat()])
+            day += timedelta(days=1)
+
+        return StubSalesEstimates(
+            {
+                "data": [
+                    {
+                        "id": f"us/{asin}",
+                        "type": "sales_estimate_result",
+                        "attributes": {"asin": asin, "data": items},
+                    }
+                ]
+            }
+        )
+
+
+
+
+@lru_cache(maxsize=None)
+def get_local_postgres(database: str = "default") -> LocalPostgres:
+    """
+    Open the local stand-in of a Postgres database, shared by the whole process
+    """
+    return LocalPostgres(database)
+
+
+# Errors raised by the connections of postgres_connection
+DatabaseError = (psycopg2.Error, duckdb.Error)
+
+
+def postgres_connection(database: str = "default"):
+    """
+    Open a psycopg2 connection to a database, or to its local stand-in
+
+    Both take the same queries, named cursors, execute_values and
+    copy_expert. Close the connection when done.
+
+    Args:
+        database: Database name, as passed to db.get_engine
+    """
+    if is_local():
+        return get_local_postgres(database).connect()
+    return get_engine(database).raw_connection()
+
+
+def neo4j_driver():
+    """
+    Create a Neo4j driver from the environment, or the local graph stand-in
+    """
+    if is_local():
+        return LocalGraph()
+    return GraphDatabase.driver(
+        os.getenv("NEO4J_URI"),
+        auth=(os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASSWORD")),
+    )
+
+
+def sellerapp_session(session: requests.Session):
+    """
+    Return the session SellerApp requests go through
+
+    Args:
+        session: Live session, replaced by the recording with the local
+            backend (and used to record missing responses with SELLERAPP_RECORD)
+    """
+    if is_local():
+        return RecordedSession(upstream=session if SELLERAPP_RECORD else None)
+    return session
+
+
+def junglescout_client():
+    """
+    Create the JungleScout client, or the recorded stand-in
+    """
+    if is_local():
+        return RecordedJungleScoutClient()
+    return ClientSync(
+        api_key_name=os.getenv("JUNGLESCOUT_API_KEY_NAME"),
+        api_key=os.getenv("JUNGLESCOUT_API_KEY"),
+        marketplace=Marketplace.US,
+        api_type=ApiType.JS,
+    )
+
+
+def read_id_file(path: str) -> List[str]:
+    """
+    Read the id column of an exported ID file
+    """
+    with open(path, newline="") as f:
+        return [row["id"] for row in csv.DictReader(f)]
+
+
+def seed_junglescout(directory: str = "data/junglescout", recordings: str = None) -> int:
+    """
+    Copy the stored sales estimate files missing from the JungleScout recordings
+
+    Recorded files are left as they are, so replays stay the same.
+
+    Args:
+        directory: Folder holding the stored {asin}.json files
+        recordings: Recording folder (default: junglescout in LOCAL_DIR)
+
+    Returns:
+        Number of files copied
+    """
+    recordings = recordings or os.path.join(LOCAL_DIR, "junglescout")
+    os.makedirs(recordings, exist_ok=True)
+    copied = 0
+    for name in sorted(os.listdir(directory)):
+        target = os.path.join(recordings, name)
+        if name.endswith(".json") and not os.path.exists(target):
+            shutil.copyfile(os.path.join(directory, name), target)
+            copied += 1
+    return copied
+
+
+def main():
+    import process
+
+    parser = argparse.ArgumentParser(
+        description="Seed the local backends from exported full/loaded ID files "
+        "and stored JungleScout responses"
+    )
+    parser.add_argument(
+        "sources",
+        nargs="+",
+        choices=[s for s in process.SOURCES if s in process.ID_TYPES]
+        + ["junglescout"],
+        help="Data sources to seed",
+    )
+    args = parser.parse_args()
+
+    if "junglescout" in args.sources:
+        copied = seed_junglescout()
+        print(f"Recorded {copied} JungleScout responses from data/junglescout")
+
+    with LocalGraph() as graph:
+        for source in args.sources:
+            if source == "junglescout":
+                continue
+            id_type = process.ID_TYPES[source]
+            cast = int if id_type == "BIGINT" else str
+            for name in ("full", "loaded"):
+                path = f"data/{source}/{name}.csv"
+                if not os.path.exists(path):
+                    print(f"Skipping {source} {name} IDs, {path} not found")
+                    continue
+                ids = [cast(id) for id in read_id_file(path)]
+                if name == "full":
+                    postgres = get_local_postgres(SOURCE_TABLES[source][0])
+                    rows = postgres.seed_ids(source, ids, id_type)
+                else:
+                    rows = graph.seed(process.NEO4J_NODES[source][0], ids)
+                print(f"Seeded {rows} {source} {name} IDs from {path}")
+
+
+if __name__ == "__main__":
+    main()
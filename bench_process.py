@@ -0,0 +1,306 @@
+import argparse
+import io
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from itertools import product
+from multiprocessing import get_context
+
+import numpy as np
+
+import process
+
+# Engine settings passed to process.process_data
+ENGINES = {
+    "duckdb-files": {"engine": "duckdb"},
+    "duckdb-in-memory": {"engine": "duckdb", "in_memory": True},
+    "postgres": {"engine": "postgres"},
+}
+LIVE_SOURCES = [s for s in process.SOURCES if s in process.ID_TYPES]
+
+# Synthetic dataset sizes, as rows in full
+SIZES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+
+# Source whose ID type each synthetic ID kind mimics
+ID_KINDS = {"numeric": "shopee", "string": "amazon"}
+
+# Share of the full IDs that are already loaded
+OVERLAPS = [0.5, 0.9, 0.99]
+
+# Offline (engine, format) combinations, in-memory runs skip the files
+OFFLINE_CASES = [
+    ("duckdb-files", "csv"),
+    ("duckdb-files", "parquet"),
+    ("duckdb-in-memory", "arrow"),
+]
+
+BASELINE_PATH = "data/bench_baseline.json"
+
+# Slowdown or memory growth over the baseline reported as a regression
+TOLERANCE = 0.2
+
+
+def synthetic_ids(kind, size, overlap, seed=0):
+    """Generate shuffled full IDs and the overlapping share of them that is loaded."""
+    rng = np.random.default_rng(seed)
+    ids = rng.permutation(size).astype(np.int64) + 1_000_000
+    loaded = ids[: int(size * overlap)].copy()
+    rng.shuffle(loaded)
+
+    if kind == "numeric":
+        return ids, loaded
+
+    # ASIN-like strings: "B0" and 8 base 36 digits of the numeric ID
+    alphabet = np.frombuffer(b"0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ", np.uint8)
+
+    def to_asins(values):
+        codes = np.empty((len(values), 10), np.uint8)
+        codes[:, 0], codes[:, 1] = ord("B"), ord("0")
+        for i in range(9, 1, -1):
+            codes[:, i] = alphabet[values % 36]
+            values = values // 36
+        return codes.view("S10").ravel().astype(str)
+
+    return to_asins(ids), to_asins(loaded)
+
+
+def iter_chunks(ids, chunk_size=process.CHUNK_SIZE):
+    """Yield an ID array as lists of Python values, like the database readers."""
+    for start in range(0, len(ids), chunk_size):
+        yield ids[start : start + chunk_size].tolist()
+
+
+def peak_rss_mb():
+    """Return the peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def write_synthetic_inputs(kind, size, overlap, path):
+    """Save the IDs of a synthetic case to an .npz file, in a process of their own."""
+    full_ids, loaded_ids = synthetic_ids(kind, SIZES[size], overlap)
+    np.savez(path, full=full_ids, loaded=loaded_ids)
+
+
+def run_synthetic_case(kind, inputs, engine, fmt, workdir):
+    """Time the export and diff of one synthetic case, meant to run in a fresh process.
+
+    Mirrors process_data with the database reads replaced by in-memory
+    chunks of the IDs stored in `inputs`: files are written with write_ids
+    or tables built with collect_ids, then diff_ids computes
+    unprocessed.csv. The peak RSS is reported above the reading taken once
+    the inputs are loaded.
+    """
+    source = ID_KINDS[kind]
+    id_type = process.ID_TYPES[source]
+    with np.load(inputs) as arrays:
+        full_ids, loaded_ids = arrays["full"], arrays["loaded"]
+    baseline_rss = peak_rss_mb()
+
+    os.chdir(workdir)
+    os.makedirs(f"data/{source}", exist_ok=True)
+    with redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        if engine == "duckdb-in-memory":
+            full = process.collect_ids(iter_chunks(full_ids), id_type)
+            loaded = process.collect_ids(iter_chunks(loaded_ids), id_type)
+        else:
+            full = f"data/{source}/full.{fmt}"
+            loaded = f"data/{source}/loaded.{fmt}"
+            process.write_ids(iter_chunks(full_ids), full, id_type, fmt)
+            process.write_ids(iter_chunks(loaded_ids), loaded, id_type, fmt)
+        process.diff_ids(source, full, loaded)
+        wall = time.perf_counter() - start
+
+    with open(f"data/{source}/unprocessed.csv") as f:
+        unprocessed = sum(1 for _ in f) - 1
+    if unprocessed != len(full_ids) - len(loaded_ids):
+        raise RuntimeError(
+            f"Expected {len(full_ids) - len(loaded_ids)} unprocessed IDs, "
+            f"found {unprocessed}"
+        )
+
+    return {
+        "wall_s": round(wall, 4),
+        "peak_rss_mb": round(peak_rss_mb() - baseline_rss, 1),
+        "rows_per_s": round((len(full_ids) + len(loaded_ids)) / wall),
+        "unprocessed": unprocessed,
+    }
+
+
+def benchmark_synthetic(sizes, kinds, overlaps, cases=OFFLINE_CASES, workdir=None):
+    """Run every synthetic case offline, each in its own process for a clean peak RSS.
+
+    The IDs of a (size, kind, overlap) are generated once, in another
+    process, so the generation peak stays out of the measured ones.
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix="bench_process_")
+    results = {}
+    context = get_context("spawn")
+    for size, kind, overlap in product(sizes, kinds, overlaps):
+        inputs = os.path.join(workdir, f"{kind}-{size}-{overlap:g}.npz")
+        with ProcessPoolExecutor(1, mp_context=context) as executor:
+            executor.submit(
+                write_synthetic_inputs, kind, size, overlap, inputs
+            ).result()
+
+        for engine, fmt in cases:
+            name = f"{kind}-{size}-{overlap:g}-{engine}-{fmt}"
+            with ProcessPoolExecutor(1, mp_context=context) as executor:
+                result = executor.submit(
+                    run_synthetic_case, kind, inputs, engine, fmt, workdir
+                ).result()
+            results[name] = result
+            print(
+                f"{name:<42} {result['wall_s']:>8.2f}s  "
+                f"{result['peak_rss_mb']:>8.1f} MB  {result['rows_per_s']:>12,} rows/s"
+            )
+        os.remove(inputs)
+
+    return results
+
+
+def compare_baseline(results, baseline, tolerance=TOLERANCE):
+    """Return the cases slower or larger than the baseline by more than tolerance."""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for metric in ("wall_s", "peak_rss_mb"):
+            if result[metric] > baseline[name][metric] * (1 + tolerance):
+                regressions.append(
+                    f"{name}: {metric} {result[metric]} vs baseline "
+                    f"{baseline[name][metric]}"
+                )
+    return regressions
+
+
+def benchmark_engines(source, engines, repeat=3):
+    """Time process_data for a source with each engine against the live databases."""
+    results = {}
+    for name in engines:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            # Keep the per-run progress output out of the report
+            with redirect_stdout(io.StringIO()):
+                process.process_data(source, **ENGINES[name])
+            timings.append(time.perf_counter() - start)
+
+        with open(f"data/{source}/unprocessed.csv") as f:
+            rows = sum(1 for _ in f) - 1
+        results[name] = {
+            "best": min(timings),
+            "median": statistics.median(timings),
+            "unprocessed": rows,
+        }
+        print(
+            f"{source:<8} {name:<18} best {results[name]['best']:>7.2f}s  "
+            f"median {results[name]['median']:>7.2f}s  unprocessed {rows}"
+        )
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the unprocessed-ID engines of process.py"
+    )
+    parser.add_argument(
+        "sources",
+        nargs="*",
+        help="Data sources to benchmark against the live databases "
+        f"({', '.join(LIVE_SOURCES)})",
+    )
+    parser.add_argument(
+        "--engines",
+        nargs="+",
+        choices=list(ENGINES),
+        default=list(ENGINES),
+        help="Engines to compare",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per engine")
+    parser.add_argument(
+        "--synthetic",
+        action="store_true",
+        help="Benchmark offline on generated ID sets instead of the databases",
+    )
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        choices=list(SIZES),
+        default=["10k", "1m"],
+        help="Synthetic dataset sizes",
+    )
+    parser.add_argument(
+        "--kinds",
+        nargs="+",
+        choices=list(ID_KINDS),
+        default=list(ID_KINDS),
+        help="Synthetic ID kinds",
+    )
+    parser.add_argument(
+        "--overlaps",
+        nargs="+",
+        type=float,
+        default=OVERLAPS,
+        help="Shares of the full IDs already loaded",
+    )
+    parser.add_argument(
+        "--baseline", default=BASELINE_PATH, help="Baseline JSON file"
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Store the synthetic results as the new baseline",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=TOLERANCE,
+        help="Allowed slowdown or memory growth over the baseline",
+    )
+    args = parser.parse_args()
+
+    if not args.sources and not args.synthetic:
+        parser.error("give sources to benchmark or --synthetic")
+    # Checked here, argparse rejects an empty list against choices
+    for source in args.sources:
+        if source not in LIVE_SOURCES:
+            parser.error(f"invalid source: {source}")
+
+    if args.sources:
+        process.setup_folders()
+        for source in args.sources:
+            benchmark_engines(source, args.engines, args.repeat)
+
+    if args.synthetic:
+        results = benchmark_synthetic(args.sizes, args.kinds, args.overlaps)
+        if args.save_baseline:
+            baseline = {}
+            if os.path.exists(args.baseline):
+                with open(args.baseline) as f:
+                    baseline = json.load(f)
+            baseline.update(results)
+            with open(args.baseline, "w") as f:
+                json.dump(baseline, f, indent=2, sort_keys=True)
+            print(f"Saved baseline to {args.baseline}")
+        elif os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                regressions = compare_baseline(results, json.load(f), args.tolerance)
+            for regression in regressions:
+                print(f"Regression: {regression}")
+            if regressions:
+                sys.exit(1)
+            print(f"No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,357 @@
 import requests
 import pandas as pd
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator
 import os
+import hashlib
+import random
+import sqlite3
+import time
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from dotenv import load_dotenv
 import json
-import psycopg2
 from psycopg2.extras import execute_values
+from requests.adapters import HTTPAdapter
+
+import backends
+from metrics import metrics
+from rate_limiter import TokenBucket
 
 load_dotenv()
 
 
+def iter_batches(items: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
+    """
+    Group an iterable into lists of at most batch_size items
+
+    Args:
+        items: Items to group
+        batch_size: Maximum items per batch
+
+    Returns:
+        Iterator of batches
+    """
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+class CrawlCheckpoint:
+    """
+    SQLite store of a category crawl's frontier and fetched categories
+    """
+
+    def __init__(self, path: str):
+        """
+        Open or create the checkpoint store
+
+        Args:
+            path: Path of the SQLite file
+        """
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS frontier (
+                category_id TEXT PRIMARY KEY,
+                done INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS categories (
+                category_id TEXT PRIMARY KEY,
+                parent_id TEXT,
+                category TEXT,
+                category_path TEXT
+            );
+            """
+        )
+
+    def pending(self, start_category_id: str) -> List[str]:
+        """
+        Return the category IDs still to fetch, seeding a new crawl with the start ID
+
+        Args:
+            start_category_id: The category ID the crawl starts from
+
+        Returns:
+            List of pending category IDs
+        """
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO frontier (category_id) VALUES (?)",
+                (start_category_id,),
+            )
+        rows = self.conn.execute("SELECT category_id FROM frontier WHERE done = 0")
+        return [row[0] for row in rows]
+
+    def categories(self) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the categories fetched so far
+
+        Returns:
+            Iterator of category dictionaries
+        """
+        rows = self.conn.execute(
+            "SELECT category_id, category, category_path FROM categories"
+        )
+        for category_id, category, category_path in rows:
+            yield {
+                "category_id": category_id,
+                "category": category,
+                "category_path": json.loads(category_path),
+            }
+
+    def complete(
+        self, parent_id: str, children: List[Dict[str, Any]], child_ids: List[str]
+    ):
+        """
+        Store a node's children and mark it done in a single transaction
+
+        Args:
+            parent_id: The category ID whose children were fetched
+            children: Processed child categories
+            child_ids: IDs of the children that have children of their own
+        """
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO categories VALUES (?, ?, ?, ?)",
+                [
+                    (
+                        child["category_id"],
+                        parent_id,
+                        child["category"],
+                        json.dumps(child["category_path"]),
+                    )
+                    for child in children
+                ],
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO frontier (category_id) VALUES (?)",
+                [(category_id,) for category_id in child_ids],
+            )
+            self.conn.execute(
+                "UPDATE frontier SET done = 1 WHERE category_id = ?", (parent_id,)
+            )
+
+    def finished(self) -> bool:
+        """
+        Check whether every node of the frontier has been fetched
+        """
+        row = self.conn.execute("SELECT count(*) FROM frontier WHERE done = 0")
+        return row.fetchone()[0] == 0
+
+    def close(self):
+        self.conn.close()
+
+
+class CategoryCache:
+    """
+    SQLite cache of category_tree responses keyed by (category_id, geo)
+    """
+
+    def __init__(self, path: str, geo: str, ttl: float, max_entries: int):
+        """
+        Open or create the cache
+
+        Args:
+            path: Path of the SQLite file
+            geo: Geographic location the cached responses belong to
+            ttl: Seconds before a cached response is considered expired
+            max_entries: Maximum cached responses, least recently used are evicted
+        """
+        self.geo = geo
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                category_id TEXT,
+                geo TEXT,
+                categories TEXT,
+                content_hash TEXT,
+                fetched_at REAL,
+                used_at REAL,
+                PRIMARY KEY (category_id, geo)
+            )
+            """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at)"
+        )
+        # Tracked so eviction only runs once the cache is over its bound
+        self.entries = self.conn.execute(
+            "SELECT count(*) FROM responses"
+        ).fetchone()[0]
+
+    def get(self, category_id: str) -> Dict[str, Any]:
+        """
+        Look up a cached response and mark it as recently used
+
+        Args:
+            category_id: The parent category ID
+
+        Returns:
+            Dictionary with the cached categories, content_hash and fresh flag,
+            or None if the response is not cached
+        """
+        row = self.conn.execute(
+            "SELECT categories, content_hash, fetched_at FROM responses "
+            "WHERE category_id = ? AND geo = ?",
+            (category_id, self.geo),
+        ).fetchone()
+        if row is None:
+            return None
+
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                "UPDATE responses SET used_at = ? WHERE category_id = ? AND geo = ?",
+                (now, category_id, self.geo),
+            )
+        return {
+            "categories": json.loads(row[0]),
+            "content_hash": row[1],
+            "fresh": now - row[2] < self.ttl,
+        }
+
+    def put(self, category_id: str, categories: List[Dict[str, Any]]) -> str:
+        """
+        Store a response, evicting the least recently used ones beyond max_entries
+
+        Args:
+            category_id: The parent category ID
+            categories: The category_tree response
+
+        Returns:
+            Content hash of the response
+        """
+        body = json.dumps(categories, sort_keys=True)
+        content_hash = hashlib.sha256(body.encode()).hexdigest()
+        now = time.time()
+
+        with self.conn:
+            exists = self.conn.execute(
+                "SELECT 1 FROM responses WHERE category_id = ? AND geo = ?",
+                (category_id, self.geo),
+            ).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (category_id, self.geo, body, content_hash, now, now),
+            )
+            if not exists:
+                self.entries += 1
+            if self.entries > self.max_entries:
+                self.conn.execute(
+                    """
+                    DELETE FROM responses WHERE rowid IN (
+                        SELECT rowid FROM responses ORDER BY used_at LIMIT ?
+                    )
+                    """,
+                    (self.entries - self.max_entries,),
+                )
+                self.entries = self.max_entries
+        return content_hash
+
+    def renew(self, category_id: str) -> int:
+        """
+        Mark the cached responses of a category and all its cached descendants
+        as freshly fetched
+
+        Args:
+            category_id: The root category ID of the subtree
+
+        Returns:
+            Number of renewed responses
+        """
+        changes = self.conn.total_changes
+        with self.conn:
+            self.conn.execute(
+                """
+                WITH RECURSIVE subtree(category_id) AS (
+                    SELECT CAST(? AS TEXT)
+                    UNION
+                    SELECT CAST(json_extract(child.value, '$.category_id') AS TEXT)
+                    FROM subtree
+                    JOIN responses r
+                        ON r.category_id = subtree.category_id AND r.geo = ?,
+                    json_each(r.categories) child
+                    WHERE json_extract(child.value, '$.has_child')
+                )
+                UPDATE responses SET fetched_at = ?
+                WHERE geo = ? AND category_id IN (SELECT category_id FROM subtree)
+                """,
+                (category_id, self.geo, time.time(), self.geo),
+            )
+        return self.conn.total_changes - changes
+
+
 class SellerAppCategoryCrawler:
     """
     Crawler for SellerApp categories to extract hierarchical category data
     """
 
-    def __init__(self, geo: str = "us"):
+    # HTTP statuses worth retrying with backoff
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(
+        self,
+        geo: str = "us",
+        base_url: str = "https://api.sellerapp.com/sellmetricsv2/category_tree",
+        max_workers: int = 8,
+        requests_per_second: float = 5.0,
+        max_retries: int = 5,
+        checkpoint_dir: str = None,
+        cache_path: str = None,
+        cache_ttl: float = 7 * 24 * 3600,
+        cache_max_entries: int = 100_000,
+    ):
         """
         Initialize crawler with authentication credentials
 
         Args:
-            client_id: The client ID for SellerApp API
-            token: Authentication token for SellerApp API
             geo: Geographic location (default: "us")
+            base_url: The category_tree endpoint, can point to a local mock server
+            max_workers: Maximum number of requests in flight
+            requests_per_second: Rate limit shared by all workers
+            max_retries: Retries on 429 and 5xx responses before giving up on a node
+            checkpoint_dir: Directory persisting crawl progress, enables resuming
+            cache_path: SQLite file caching category_tree responses, enables refresh crawls
+            cache_ttl: Seconds before a cached response is revalidated
+            cache_max_entries: Cached responses kept, least recently used are evicted
         """
         client_id = os.getenv("SELLERAPP_CLIENT_ID")
         token = os.getenv("SELLERAPP_TOKEN")
         self.geo = geo
         self.headers = {"client-id": client_id, "token": token}
-        self.base_url = "https://api.sellerapp.com/sellmetricsv2/category_tree"
+        self.base_url = base_url
         self.all_categories = []
-
-    def fetch_categories(self, category_id: str) -> List[Dict[str, Any]]:
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.checkpoint_dir = checkpoint_dir
+        if checkpoint_dir:
+            os.makedirs(checkpoint_dir, exist_ok=True)
+        self.rate_limiter = TokenBucket(requests_per_second)
+        self.cache = (
+            CategoryCache(cache_path, geo, cache_ttl, cache_max_entries)
+            if cache_path
+            else None
+        )
+
+        # Shared keep-alive session, one pooled connection per worker
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session = backends.sellerapp_session(self.session)
+
+    def request_categories(self, category_id: str) -> List[Dict[str, Any]]:
         """
-        Fetch categories for a given parent category ID
+        Fetch categories for a given parent category ID, raising on failure
 
         Args:
             category_id: The parent category ID to fetch children for
@@ -43,11 +361,43 @@ class SellerAppCategoryCrawler:
         """
         params = {"key": category_id, "key_type": "id", "geo": self.geo}
 
-        try:
-            response = requests.get(self.base_url, headers=self.headers, params=params)
+        for attempt in range(self.max_retries + 1):
+            with metrics.stage("sellerapp.rate_limit_wait"):
+                self.rate_limiter.acquire()
+            with metrics.stage("sellerapp.request"):
+                response = self.session.get(self.base_url, params=params)
+            metrics.count("sellerapp.api_calls")
+            if (
+                response.status_code in self.RETRY_STATUSES
+                and attempt < self.max_retries
+            ):
+                metrics.count("sellerapp.retries")
+                # Honour Retry-After when given, otherwise back off exponentially
+                retry_after = response.headers.get("Retry-After", "")
+                delay = (
+                    float(retry_after)
+                    if retry_after.isdigit()
+                    else 2**attempt + random.random()
+                )
+                time.sleep(delay)
+                continue
             response.raise_for_status()
             return response.json()
+
+    def fetch_categories(self, category_id: str) -> List[Dict[str, Any]]:
+        """
+        Fetch categories for a given parent category ID
+
+        Args:
+            category_id: The parent category ID to fetch children for
+
+        Returns:
+            List of category dictionaries, empty if the request failed
+        """
+        try:
+            return self.request_categories(category_id)
         except requests.RequestException as e:
+            metrics.count("sellerapp.failed_requests")
             print(f"Error fetching categories for ID {category_id}: {e}")
             return []
 
@@ -65,27 +415,139 @@ class SellerAppCategoryCrawler:
         components = path.strip("/").split("/")
         return components
 
-    def crawl_categories(self, start_category_id: str):
+    def iter_categories(self, start_category_id: str) -> Iterator[Dict[str, Any]]:
         """
-        Recursively crawl all categories starting from the given category ID
+        Crawl all categories below the given category ID, yielding them as they are fetched
+
+        Child lists are fetched concurrently by up to `max_workers` threads, a
+        node's children being queued as soon as its own response arrives.
+        With a checkpoint directory the frontier and fetched categories are
+        persisted, so a restarted crawl first yields the stored categories
+        and then only fetches the nodes still pending. Nodes whose request
+        failed stay pending for the next run, and the checkpoint is removed
+        once every node has been fetched.
+
+        With a response cache, nodes with a fresh cache entry are not
+        fetched. Expired nodes are fetched again, which renews their entry,
+        and when the response hashes the same as the cached one their whole
+        cached subtree is renewed too, so its descendants are served from
+        the cache instead of being fetched again.
 
         Args:
             start_category_id: The category ID to start crawling from
+
+        Returns:
+            Iterator of category dictionaries
         """
-        categories = self.fetch_categories(start_category_id)
+        checkpoint = None
+        if self.checkpoint_dir:
+            checkpoint = CrawlCheckpoint(
+                os.path.join(
+                    self.checkpoint_dir, f"{self.geo}_{start_category_id}.sqlite"
+                )
+            )
+            yield from checkpoint.categories()
+            frontier = checkpoint.pending(start_category_id)
+        else:
+            frontier = [start_category_id]
+
+        pending = {}  # future -> category_id
+        ready = deque()  # (category_id, categories) served from cache
+        expired = {}  # category_id -> content_hash of its expired cache entry
+        api_calls = cache_hits = 0
+
+        def schedule(category_id):
+            # Serve fresh cache entries without calling the API
+            nonlocal api_calls, cache_hits
+            entry = self.cache.get(category_id) if self.cache else None
+            if entry and entry["fresh"]:
+                cache_hits += 1
+                ready.append((category_id, entry["categories"]))
+                return
+            if entry:
+                expired[category_id] = entry["content_hash"]
+
+            api_calls += 1
+            future = executor.submit(self.request_categories, category_id)
+            pending[future] = category_id
+
+        def process(parent_id, categories):
+            # Process the categories
+            children = [
+                {
+                    "category_id": category["category_id"],
+                    "category": category["name"],
+                    "category_path": self.process_category_path(
+                        category["category_path"]
+                    ),
+                }
+                for category in categories
+            ]
+            child_ids = [
+                category["category_id"]
+                for category in categories
+                if category["has_child"]
+            ]
+            if checkpoint:
+                checkpoint.complete(parent_id, children, child_ids)
+            yield from children
+
+            # Crawl child categories if they exist
+            for category_id in child_ids:
+                schedule(category_id)
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            for category_id in frontier:
+                schedule(category_id)
+
+            while pending or ready:
+                while ready:
+                    yield from process(*ready.popleft())
+                if not pending:
+                    continue
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    parent_id = pending.pop(future)
+                    try:
+                        categories = future.result()
+                    except requests.RequestException as e:
+                        print(f"Error fetching categories for ID {parent_id}: {e}")
+                        continue
+
+                    if self.cache:
+                        content_hash = self.cache.put(parent_id, categories)
+                        # Unchanged children, keep their cached subtree
+                        if expired.pop(parent_id, None) == content_hash:
+                            self.cache.renew(parent_id)
+                    yield from process(parent_id, categories)
+
+            # A finished crawl starts over next time
+            if checkpoint and checkpoint.finished():
+                checkpoint.close()
+                os.remove(checkpoint.path)
+        finally:
+            # Drop the queued requests when the consumer stops early
+            executor.shutdown(cancel_futures=True)
+            if checkpoint:
+                checkpoint.close()
 
-        for category in categories:
-            # Process and store the category
-            category_data = {
-                "category_id": category["category_id"],
-                "category": category["name"],
-                "category_path": self.process_category_path(category["category_path"]),
-            }
-            self.all_categories.append(category_data)
+        if self.cache:
+            print(
+                f"Crawled {api_calls + cache_hits} nodes with {api_calls} API calls, "
+                f"saved {cache_hits} calls through the cache"
+            )
 
-            # Recursively crawl child categories if they exist
-            if category["has_child"]:
-                self.crawl_categories(category["category_id"])
+    def crawl_categories(self, start_category_id: str):
+        """
+        Crawl all categories starting from the given category ID
+
+        Args:
+            start_category_id: The category ID to start crawling from
+        """
+        with metrics.stage("sellerapp.crawl"):
+            self.all_categories.extend(self.iter_categories(start_category_id))
 
     def get_categories_dataframe(self, start_category_id: str) -> pd.DataFrame:
         """
@@ -101,78 +563,103 @@ class SellerAppCategoryCrawler:
         self.crawl_categories(start_category_id)
         return pd.DataFrame(self.all_categories)
 
-    def ingest_categories(self, df: pd.DataFrame):
+    @metrics.timed("sellerapp.ingest")
+    def ingest_categories(
+        self,
+        categories: Iterable[Dict[str, Any]],
+        batch_size: int = 1000,
+        dump_path: str = None,
+    ) -> int:
         """
-        Ingest categories into the database
+        Ingest categories into the database in pages, committing each page
+
+        Categories are consumed as they arrive, so passing `iter_categories`
+        ingests while the crawl is still running.
 
         Args:
-            df: DataFrame containing category data to be ingested
-        """
-        # Get database connection parameters from environment variables
-        db_host = os.getenv("PG_HOST")
-        db_name = os.getenv("PG_DATABASE")
-        db_user = os.getenv("PG_USER")
-        db_password = os.getenv("PG_PASSWORD")
+            categories: DataFrame or iterable of category dictionaries to be ingested
+            batch_size: Number of categories inserted and committed per page
+            dump_path: Optional JSON file also receiving the inserted rows
 
-        try:
-            # Connect to the database
-            conn = psycopg2.connect(
-                host=db_host, database=db_name, user=db_user, password=db_password
+        Returns:
+            Number of categories ingested
+        """
+        if isinstance(categories, pd.DataFrame):
+            categories = (
+                row._asdict() for row in categories.itertuples(index=False)
             )
-            cursor = conn.cursor()
 
-            # Prepare data for insertion
-            data_to_insert = []
-            for _, row in df.iterrows():
-                # Convert category_path list to JSON string
-                category_path_json = json.dumps(row["category_path"])
+        # SQL query for insertion
+        query = """
+            INSERT INTO amz.bestsellers (category_id, market, category, category_path, url)
+            VALUES %s
+            ON CONFLICT (category_id, market) DO UPDATE 
+            SET category = EXCLUDED.category,
+                category_path = EXCLUDED.category_path,
+                updated_at = NOW()
+        """
 
-                # Generate Amazon URL based on category_id
+        ingested = 0
+        start = time.perf_counter()
+        dump = open(dump_path, "w") if dump_path else None
+        conn = cursor = None
 
-                # Create tuple with all required fields
-                data_to_insert.append(
+        try:
+            # Borrow a connection from the shared pool
+            conn = backends.postgres_connection()
+            cursor = conn.cursor()
+            if dump:
+                dump.write("[")
+
+            for batch in iter_batches(categories, batch_size):
+                # Create tuples with all required fields
+                data_to_insert = [
                     (
-                        row["category_id"],
+                        category["category_id"],
                         self.geo,  # Using the geo attribute as market
-                        row["category"],
-                        category_path_json,
+                        category["category"],
+                        # Convert category_path list to JSON string
+                        json.dumps(category["category_path"]),
                         "",
                     )
-                )
-
-            # save to json file
-            with open("sellerapp_categories.json", "w") as f:
-                json.dump(data_to_insert, f)
-            # return
-
-            # SQL query for insertion
-            query = """
-                INSERT INTO amz.bestsellers (category_id, market, category, category_path, url)
-                VALUES %s
-                ON CONFLICT (category_id, market) DO UPDATE 
-                SET category = EXCLUDED.category,
-                    category_path = EXCLUDED.category_path,
-                    updated_at = NOW()
-            """
-
-            # Execute batch insert
-            execute_values(cursor, query, data_to_insert)
-            conn.commit()
-
+                    for category in batch
+                ]
+
+                # Execute batch insert
+                with metrics.stage("sellerapp.db_write"):
+                    execute_values(cursor, query, data_to_insert, page_size=batch_size)
+                    conn.commit()
+                metrics.count("sellerapp.categories_ingested", len(data_to_insert))
+
+                if dump:
+                    rows = ",".join(json.dumps(row) for row in data_to_insert)
+                    dump.write(("," if ingested else "") + rows)
+                ingested += len(data_to_insert)
+
+            elapsed = time.perf_counter() - start
+            rate = ingested / elapsed if elapsed > 0 else 0
             print(
-                f"Successfully ingested {len(data_to_insert)} categories into the database"
+                f"Successfully ingested {ingested} categories into the database "
+                f"in {elapsed:.1f}s ({rate:,.0f} rows/s)"
             )
 
-        except Exception as e:
-            print(f"Error ingesting categories into database: {e}")
-            if "conn" in locals() and conn:
+        except backends.DatabaseError as e:
+            print(
+                f"Error ingesting categories into database after {ingested} rows: {e}"
+            )
+            if conn:
                 conn.rollback()
         finally:
-            if "cursor" in locals() and cursor:
+            if dump:
+                dump.write("]")
+                dump.close()
+            if cursor:
                 cursor.close()
-            if "conn" in locals() and conn:
+            if conn:
                 conn.close()
 
+        return ingested
+
 
 if __name__ == "__main__":
     # Example usage
@@ -182,14 +669,25 @@ if __name__ == "__main__":
     ]
     geo = "us"
 
-    crawler = SellerAppCategoryCrawler(geo)
+    # Progress is kept per start category so an interrupted crawl resumes
+    crawler = SellerAppCategoryCrawler(
+        geo,
+        checkpoint_dir="data/sellerapp_crawl",
+        cache_path="data/sellerapp_cache.sqlite",
+    )
     for start_category_id in START_CATEGORY_IDS:
-        df = crawler.get_categories_dataframe(start_category_id)
-        crawler.ingest_categories(df)
+        # Categories are ingested while the crawl is still running, so the
+        # crawl stage includes the sellerapp.ingest one
+        with metrics.stage("sellerapp.crawl"):
+            total = crawler.ingest_categories(
+                crawler.iter_categories(start_category_id),
+                dump_path="sellerapp_categories.json",
+            )
 
         # Display the results
-        print(f"Total categories found: {len(df)}")
-        # print(df.head())
+        print(f"Total categories found: {total}")
+
+    metrics.write_report("sellerapp")
 
     # Save to CSV (optional)
-    # df.to_csv("sellerapp_categories.csv", index=False)
+    # crawler.get_categories_dataframe(start_category_id).to_csv("sellerapp_categories.csv", index=False)
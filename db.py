@@ -0,0 +1,60 @@
+import os
+from contextlib import contextmanager
+from functools import lru_cache
+
+from dotenv import load_dotenv
+from sqlalchemy import URL, create_engine
+
+load_dotenv()
+
+# Environment variable holding the name of each database
+DATABASES = {
+    "default": "PG_DATABASE",
+    "app": "PG_DATABASE_APP",
+}
+
+# Connections kept open per database and extra ones allowed under load
+POOL_SIZE = int(os.getenv("PG_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.getenv("PG_MAX_OVERFLOW", "10"))
+
+# Longest a single statement may run, in milliseconds (0 disables the limit)
+STATEMENT_TIMEOUT_MS = int(os.getenv("PG_STATEMENT_TIMEOUT_MS", "0"))
+
+
+def get_engine(database="default"):
+    """Return the pooled SQLAlchemy engine of a database, created once per process."""
+    return _create_engine(database)
+
+
+@lru_cache(maxsize=None)
+def _create_engine(database):
+    url = URL.create(
+        "postgresql+psycopg2",
+        username=os.getenv("PG_USER"),
+        password=os.getenv("PG_PASSWORD"),
+        host=os.getenv("PG_HOST", "localhost"),
+        port=int(os.getenv("PG_PORT", "5432")),
+        database=os.getenv(DATABASES[database]),
+    )
+    connect_args = {}
+    if STATEMENT_TIMEOUT_MS:
+        connect_args["options"] = f"-c statement_timeout={STATEMENT_TIMEOUT_MS}"
+
+    return create_engine(
+        url,
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
+        # Replace connections dropped by the server before handing them out
+        pool_pre_ping=True,
+        connect_args=connect_args,
+    )
+
+
+@contextmanager
+def raw_connection(database="default"):
+    """Borrow a psycopg2 connection from the pool, rolled back and returned on exit."""
+    conn = get_engine(database).raw_connection()
+    try:
+        yield conn
+    finally:
+        conn.close()
@@ -1,49 +1,79 @@
 import os
+import argparse
 import json
-from sqlalchemy import create_engine, text
+import random
+import threading
+import time
+import httpx
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from datetime import datetime, timedelta
-from junglescout import ClientSync
-from junglescout.models.parameters import Marketplace, ApiType, FilterOptions, Sort
+from junglescout.exceptions import JungleScoutHTTPError
+from junglescout.models.parameters import FilterOptions, Sort
 from dotenv import load_dotenv
+from psycopg2.extras import execute_values
+
+import backends
+from metrics import metrics
+from rate_limiter import TokenBucket
+from sales_manifest import SalesManifest
+from sales_store import SalesStore, normalize_sales_estimates
 
 load_dotenv()
 
+# Concurrent sales estimate requests and the shared API quota they draw from
+WORKERS = int(os.getenv("JUNGLESCOUT_WORKERS", "8"))
+REQUESTS_PER_SECOND = float(os.getenv("JUNGLESCOUT_REQUESTS_PER_SECOND", "5"))
+MAX_RETRIES = 5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
 
-category = "Women Tennis Dresses"
-record_date = "2025-02-06"
-start_date = datetime.strptime(record_date, "%Y-%m-%d") - timedelta(days=30)
-start_date = start_date.strftime("%Y-%m-%d")
+MANIFEST_PATH = "data/junglescout_manifest.sqlite"
+SALES_STORE_PATH = "data/junglescout_sales.duckdb"
 
-js_client = ClientSync(
-    api_key_name=os.getenv("JUNGLESCOUT_API_KEY_NAME"),
-    api_key=os.getenv("JUNGLESCOUT_API_KEY"),
-    marketplace=Marketplace.US,
-    api_type=ApiType.JS,
-)
-engine = create_engine(
-    f"postgresql://{os.getenv('PG_USER')}:{os.getenv('PG_PASSWORD')}@"
-    f"{os.getenv('PG_HOST')}:{os.getenv('PG_PORT')}/{os.getenv('PG_DATABASE')}"
-)
+# ASINs updated per statement when writing sales estimates
+INGEST_BATCH_SIZE = 500
 
+# Days of sales history fetched before each job's record date
+WINDOW_DAYS = 30
 
-def get_asins(category):
-    print(f"Retrieving ASINs for category '{category}'")
+rate_limiter = TokenBucket(REQUESTS_PER_SECOND)
+
+# Serializes the first opening of the manifest and sales store, concurrent
+# first calls from the workers would each open and import their own
+stores_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def get_client():
+    """Create the JungleScout client shared by every job."""
+    return backends.junglescout_client()
+
+
+def get_category_asins(categories):
+    """Return the ASINs of several categories, keyed by category, in one query."""
+    print(f"Retrieving ASINs for {len(categories)} categories")
     try:
-        query = text(
-            """
-            SELECT ab.asin
+        query = """
+            SELECT ab.category, ab.asin
             FROM raw.amazon_bestsellers ab
             JOIN raw.amazon_products ap ON ab.asin = ap.asin
-            WHERE ab.category = :category
+            WHERE ab.category = ANY(%(categories)s)
         """
-        )
-
-        # Create SQLAlchemy engine
 
-        with engine.connect() as conn:
-            asins = conn.execute(query, {"category": category}).scalars().all()
+        conn = backends.postgres_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(query, {"categories": list(categories)})
+                rows = cursor.fetchall()
+        finally:
+            conn.close()
 
-        print(f"Retrieved {len(asins)} ASINs for category '{category}'")
+        asins = {category: [] for category in categories}
+        for category, asin in rows:
+            asins[category].append(asin)
+        for category in categories:
+            print(f"Retrieved {len(asins[category])} ASINs for category '{category}'")
         return asins
 
     except Exception as e:
@@ -51,73 +81,383 @@ def get_asins(category):
         raise
 
 
-def get_proccessed_asins():
-    # Read all asins from /data/junglescout/{asin}.json
-    asins = []
-    for asin in os.listdir("data/junglescout"):
-        asins.append(asin.split(".")[0])
-    return asins
+def get_asins(category):
+    return get_category_asins([category])[category]
 
 
-def ingest_sales_volume(asin, sale_volume):
-    print(f"Updating sales volume for {asin}: {sale_volume}")
-    try:
-        query = text(
-            """
-            UPDATE raw.amazon_products
-            SET est_mly_units_sold = :sales_volume
-            WHERE asin = :asin
-        """
-        )
+def get_manifest():
+    """Return the manifest of fetched ASINs shared by every worker."""
+    with stores_lock:
+        return _open_manifest()
+
+
+@lru_cache(maxsize=None)
+def _open_manifest():
+    """Open the manifest, indexing files stored before it existed."""
+    manifest = SalesManifest(MANIFEST_PATH)
+    manifest.bootstrap("data/junglescout")
+    return manifest
 
-        with engine.connect() as conn:
-            conn.execute(query, {"asin": asin, "sales_volume": sale_volume})
 
-        print(f"Ingested sales volume for {asin}")
+def get_store():
+    """Return the daily sales store shared by every worker."""
+    with stores_lock:
+        return _open_store()
+
+
+@lru_cache(maxsize=None)
+def _open_store():
+    """Open the daily sales store, loading the stored JSON files when it is new."""
+    store = SalesStore(SALES_STORE_PATH)
+    if store.is_empty():
+        store.import_json_dir("data/junglescout")
+    return store
+
+
+def get_proccessed_asins(end_date=None):
+    """Return the set of ASINs with a complete sales file reaching end_date."""
+    return get_manifest().complete_asins(end_date)
+
+
+@metrics.timed("junglescout.db_write")
+def ingest_sales_estimates(rows, batch_size=INGEST_BATCH_SIZE):
+    """Update the sales estimates of many ASINs with one statement per batch.
+
+    `rows` are (asin, est_mly_units_sold, est_avg_dly_units_sold) tuples. A
+    None estimate leaves the stored value unchanged.
+    """
+    rows = list(rows)
+    metrics.count("junglescout.rows_ingested", len(rows))
+    print(f"Updating sales estimates for {len(rows)} ASINs")
+    query = """
+        UPDATE raw.amazon_products ap
+        SET est_mly_units_sold = COALESCE(v.est_mly_units_sold, ap.est_mly_units_sold),
+            est_avg_dly_units_sold = COALESCE(v.est_avg_dly_units_sold, ap.est_avg_dly_units_sold)
+        FROM (VALUES %s) AS v (asin, est_mly_units_sold, est_avg_dly_units_sold)
+        WHERE ap.asin = v.asin
+    """
+    try:
+        conn = backends.postgres_connection()
+        try:
+            with conn.cursor() as cursor:
+                for start in range(0, len(rows), batch_size):
+                    execute_values(
+                        cursor,
+                        query,
+                        rows[start : start + batch_size],
+                        template="(%s, %s::numeric, %s::numeric)",
+                        page_size=batch_size,
+                    )
+                    conn.commit()
+        finally:
+            conn.close()
+
+        print(f"Ingested sales estimates for {len(rows)} ASINs")
 
     except Exception as e:
-        print(f"Error ingesting sales volume: {str(e)}")
+        print(f"Error ingesting sales estimates: {str(e)}")
         raise
 
 
-def aggregate_sales_volume(json_data):
-    try:
-        json_data = json_data.get("data")[0]
-        sales_data = json_data.get("attributes", {}).get("data", [])
+def ingest_sales_volume(asin, sale_volume):
+    print(f"Updating sales volume for {asin}: {sale_volume}")
+    ingest_sales_estimates([(asin, sale_volume, None)])
 
-        total_sales_volume = sum(item["estimated_units_sold"] for item in sales_data)
 
-        return total_sales_volume
+def request_sales_estimates(asin, start_date, end_date):
+    """Call the sales estimates API, retrying throttled and failed requests."""
+    for attempt in range(MAX_RETRIES + 1):
+        with metrics.stage("junglescout.rate_limit_wait"):
+            rate_limiter.acquire()
+        metrics.count("junglescout.api_calls")
+        try:
+            with metrics.stage("junglescout.request"):
+                return get_client().sales_estimates(
+                    asin, start_date, end_date, sort_option=None
+                )
+        except (JungleScoutHTTPError, httpx.TransportError) as e:
+            # The client only wraps HTTP status errors, timeouts and connection
+            # errors come through as raw transport errors
+            response = getattr(getattr(e, "httpx_exception", e), "response", None)
+            retryable = (
+                isinstance(e, httpx.TransportError)
+                or response is None
+                or response.status_code in RETRY_STATUSES
+            )
+            if not retryable or attempt == MAX_RETRIES:
+                raise
+            metrics.count("junglescout.retries")
+            # Exponential backoff with full jitter so workers do not retry in lockstep
+            time.sleep(random.uniform(0, 2**attempt))
 
-    except Exception as e:
-        print(f"Error processing sales data: {e}")
-        return None
 
+def missing_date_ranges(asin, start_date, end_date):
+    """Return the (start, end) date ranges of the window not fetched yet.
+
+    A day is covered when the sales store has a row for it, or when it falls
+    in a range already requested from the API, so days the API has no data
+    for are not requested again on every run.
+    """
+    stored = get_store().stored_dates(asin, start_date, end_date)
+    for range_start, range_end in get_manifest().fetched_ranges(
+        asin, start_date, end_date
+    ):
+        day = datetime.strptime(range_start, "%Y-%m-%d").date()
+        range_last = datetime.strptime(range_end, "%Y-%m-%d").date()
+        while day <= range_last:
+            stored.add(day)
+            day += timedelta(days=1)
+
+    day = datetime.strptime(start_date, "%Y-%m-%d").date()
+    last = datetime.strptime(end_date, "%Y-%m-%d").date()
 
-def fetch_and_store_sales_data(asin, start_date, end_date):
-    print(f"Retrieving product data for {asin} from {start_date} to {end_date}")
+    ranges = []
+    range_start = None
+    while day <= last:
+        if day not in stored and range_start is None:
+            range_start = day
+        elif day in stored and range_start is not None:
+            ranges.append((range_start, day - timedelta(days=1)))
+            range_start = None
+        day += timedelta(days=1)
+    if range_start is not None:
+        ranges.append((range_start, last))
+
+    return [(start.isoformat(), end.isoformat()) for start, end in ranges]
+
+
+def merge_windows(windows):
+    """Merge (start, end) date windows into sorted, non-overlapping windows."""
+    merged = []
+    for start_date, end_date in sorted(windows):
+        if merged:
+            last_start, last_end = merged[-1]
+            day_after = datetime.strptime(last_end, "%Y-%m-%d") + timedelta(days=1)
+            if start_date <= day_after.strftime("%Y-%m-%d"):
+                merged[-1] = (last_start, max(last_end, end_date))
+                continue
+        merged.append((start_date, end_date))
+    return merged
+
+
+def merge_sales_window(asin, start_date, end_date, output_file, data=None):
+    """Rebuild the stored JSON response of an ASIN from the store's daily rows.
+
+    The latest response, or the existing file, is kept as template and its
+    daily data replaced by every stored day of the window.
+    """
+    if data is None and os.path.exists(output_file) and os.path.getsize(output_file):
+        with open(output_file) as f:
+            data = json.load(f)
+    if not data or not data.get("data"):
+        data = {
+            "data": [
+                {
+                    "id": f"us/{asin}",
+                    "type": "sales_estimate_result",
+                    "attributes": {"asin": asin},
+                }
+            ]
+        }
+
+    daily = get_store().daily_sales([asin], start_date, end_date)
+    data["data"][0]["attributes"]["data"] = [
+        {
+            "date": row.date.strftime("%Y-%m-%d"),
+            "estimated_units_sold": int(row.estimated_units_sold),
+            "last_known_price": (
+                None if pd.isna(row.last_known_price) else row.last_known_price
+            ),
+        }
+        for row in daily.itertuples()
+    ]
+    return data
+
+
+@metrics.timed("junglescout.fetch_and_store")
+def fetch_and_store_sales_data(asin, start_date, end_date, ingest=True, windows=()):
+    """Fetch, store and aggregate the sales estimates of one ASIN.
+
+    Only the date ranges of the window that are not in the sales store yet
+    are requested, along with those of the other (start, end) `windows`,
+    merged first so overlapping windows request each day once. Then the
+    stored start_date..end_date window is written back to the JSON file
+    and aggregated in the store. Returns the (asin, est_mly_units_sold,
+    est_avg_dly_units_sold) row, which is written to the database right away
+    unless `ingest` is False, or None when the fetch failed.
+    """
     try:
-        response = js_client.sales_estimates(
-            asin, start_date, end_date, sort_option=None
-        )
-        data = response.model_dump()
+        data = None
+        ranges = [
+            missing
+            for window_start, window_end in merge_windows(
+                [*windows, (start_date, end_date)]
+            )
+            for missing in missing_date_ranges(asin, window_start, window_end)
+        ]
+        for range_start, range_end in ranges:
+            print(f"Retrieving product data for {asin} from {range_start} to {range_end}")
+            response = request_sales_estimates(asin, range_start, range_end)
+            data = response.model_dump()
+            with metrics.stage("junglescout.store_write"):
+                days = get_store().append(normalize_sales_estimates(data))
+            metrics.count("junglescout.days_fetched", days)
+            # Days up to yesterday are final, later ones may still get data
+            covered_end = min(
+                range_end, (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+            )
+            if covered_end >= range_start:
+                get_manifest().record_range(asin, range_start, covered_end)
+
         # Store JSON response to data/junglescout folder, named by ASIN
         output_file = f"data/junglescout/{asin}.json"
-        with open(output_file, "w") as f:
-            f.write(json.dumps(data))
+        data = merge_sales_window(asin, start_date, end_date, output_file, data)
+        with metrics.stage("junglescout.serialize"):
+            content = json.dumps(data)
+            with open(output_file, "w") as f:
+                f.write(content)
+        metrics.count("junglescout.bytes_written", len(content))
+        get_manifest().record(asin, start_date, end_date, output_file)
 
         print(f"Aggregating sales volume for {asin}")
-        sale_volume = aggregate_sales_volume(data)
-        ingest_sales_volume(asin, sale_volume)
+        totals = get_store().totals([asin], start_date, end_date)
+        sale_volume = int(totals["sale_volume"].sum())
+        daily_count = int(totals["daily_count"].sum())
+        # No day with sales means an average of 0, not an unknown one
+        average_daily_sales = sale_volume / daily_count if daily_count else 0
+        row = (asin, sale_volume, average_daily_sales)
+        if ingest:
+            ingest_sales_estimates([row])
+        return row
 
     except Exception as e:
         print(f"Error retrieving products: {str(e)}")
+        metrics.count("junglescout.failed_asins")
+        get_manifest().record_failure(asin, start_date, end_date)
+        return None
+
+
+def fetch_sales_data_concurrently(asins, start_date, end_date, workers=WORKERS):
+    """Fetch and store sales data for many ASINs on a pool of workers."""
+    windows = {asin: [(start_date, end_date)] for asin in asins}
+    return fetch_sales_windows(windows, workers)
+
+
+def fetch_sales_windows(windows, workers=WORKERS):
+    """Fetch and store sales data for ASINs mapped to their (start, end) windows.
+
+    Every window of an ASIN is fetched, its estimates are aggregated over the
+    last one. Sales estimates are written to the database in batches as
+    results arrive.
+    """
+    # Log in once before the workers share the client session
+    get_client().session
+
+    start = time.perf_counter()
+    completed = failed = 0
+    rows = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                fetch_and_store_sales_data,
+                asin,
+                *asin_windows[-1],
+                ingest=False,
+                windows=asin_windows[:-1],
+            )
+            for asin, asin_windows in windows.items()
+        ]
+        for future in as_completed(futures):
+            completed += 1
+            row = future.result()
+            if row is None:
+                failed += 1
+            else:
+                rows.append(row)
+            if len(rows) >= INGEST_BATCH_SIZE:
+                ingest_sales_estimates(rows)
+                rows = []
+            if completed % 25 == 0 or completed == len(futures):
+                elapsed = time.perf_counter() - start
+                print(
+                    f"Progress: {completed}/{len(futures)} ASINs, {failed} failed, "
+                    f"{completed / elapsed:.2f} ASINs/s"
+                )
+
+    if rows:
+        ingest_sales_estimates(rows)
+
+    return completed - failed
+
+
+def run_jobs(jobs, workers=WORKERS):
+    """Fetch the sales data of every ASIN in a list of (category, record_date) jobs.
+
+    ASINs are resolved for all categories in one query. An ASIN listed in
+    several jobs is fetched once, over each job's window but not the days
+    between them, and its estimates are aggregated over the window of its
+    latest record date. ASINs whose stored data already reaches that date
+    are skipped.
+    """
+    categories = list(dict.fromkeys(category for category, _ in jobs))
+    asins_by_category = get_category_asins(categories)
+
+    windows = {}
+    for category, record_date in jobs:
+        start_date = datetime.strptime(record_date, "%Y-%m-%d") - timedelta(
+            days=WINDOW_DAYS
+        )
+        start_date = start_date.strftime("%Y-%m-%d")
+        for asin in asins_by_category[category]:
+            windows.setdefault(asin, set()).add((start_date, record_date))
+
+    manifest = get_manifest()
+    # Windows sorted by record date, the latest one is aggregated
+    pending = {
+        asin: sorted(asin_windows, key=lambda window: window[1])
+        for asin, asin_windows in windows.items()
+        if not manifest.is_complete(asin, max(end for _, end in asin_windows))
+    }
+    print(
+        f"{len(windows)} distinct ASINs across {len(jobs)} jobs, "
+        f"{len(pending)} to fetch"
+    )
+    return fetch_sales_windows(pending, workers)
+
+
+def load_jobs(path):
+    """Read jobs from a JSON file of {"category": ..., "record_date": ...} objects."""
+    with open(path) as f:
+        return [(job["category"], job["record_date"]) for job in json.load(f)]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fetch JungleScout sales estimates for bestseller categories"
+    )
+    parser.add_argument(
+        "--job",
+        nargs=2,
+        action="append",
+        default=[],
+        metavar=("CATEGORY", "RECORD_DATE"),
+        help="Category and record date (YYYY-MM-DD) to fetch, can be repeated",
+    )
+    parser.add_argument("--jobs", help="JSON file with a list of jobs")
+    parser.add_argument(
+        "--workers", type=int, default=WORKERS, help="Concurrent API requests"
+    )
+    args = parser.parse_args()
+
+    jobs = [tuple(job) for job in args.job]
+    if args.jobs:
+        jobs.extend(load_jobs(args.jobs))
+    if not jobs:
+        parser.error("no jobs given, use --job or --jobs")
 
+    run_jobs(jobs, args.workers)
+    metrics.write_report("junglescout")
 
-asins = get_asins(category)
-proccessed_asins = get_proccessed_asins()
 
-for asin in asins:
-    if asin in proccessed_asins:
-        continue
-    fetch_and_store_sales_data(asin, start_date, record_date)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import cProfile
+import functools
+import json
+import os
+import pstats
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict
+
+# Folder receiving the per-run JSON reports
+METRICS_DIR = os.getenv("METRICS_DIR", "data/metrics")
+
+# Set to 1 to profile the stages, one at a time, and dump the profile of the slowest one
+METRICS_PROFILE = os.getenv("METRICS_PROFILE", "0") == "1"
+
+
+class Metrics:
+    """
+    Thread-safe stage timers and counters of one pipeline run
+    """
+
+    def __init__(self, profile: bool = METRICS_PROFILE):
+        """
+        Start a run
+
+        Args:
+            profile: Profile the stages with cProfile, one stage at a time
+        """
+        self.lock = threading.Lock()
+        self.started_at = datetime.now()
+        self.start = time.perf_counter()
+        self.stages = defaultdict(lambda: {"calls": 0, "seconds": 0.0})
+        self.counters = defaultdict(int)
+        self.profile = profile
+        self.profiles = {}
+        self.profiling = False
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Time a block of code, adding its duration to the named stage
+
+        Args:
+            name: Stage name, dotted by script (e.g. "amazon.postgres_export")
+        """
+        profiler = None
+        if self.profile:
+            # Since Python 3.12 cProfile allows one active profiler per process,
+            # stages starting while another one is profiled are only timed
+            with self.lock:
+                if not self.profiling:
+                    self.profiling = True
+                    profiler = cProfile.Profile()
+            if profiler:
+                try:
+                    profiler.enable()
+                except ValueError:
+                    # Another profiler outside this class is already active
+                    profiler = None
+                    with self.lock:
+                        self.profiling = False
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if profiler:
+                profiler.disable()
+            with self.lock:
+                self.stages[name]["calls"] += 1
+                self.stages[name]["seconds"] += elapsed
+                if profiler:
+                    self.profiling = False
+                    if name in self.profiles:
+                        self.profiles[name].add(profiler)
+                    else:
+                        self.profiles[name] = pstats.Stats(profiler)
+
+    def timed(self, name: str):
+        """
+        Decorate a function so every call is timed as the named stage
+
+        Args:
+            name: Stage name
+        """
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def count(self, name: str, value: int = 1):
+        """
+        Add to a counter such as rows, bytes, API calls or retries
+
+        Args:
+            name: Counter name
+            value: Amount to add
+        """
+        with self.lock:
+            self.counters[name] += value
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Summarize the run, stages sorted from slowest to fastest
+
+        Returns:
+            Dictionary with the run times, stages and counters
+        """
+        with self.lock:
+            stages = {
+                name: {
+                    "calls": stage["calls"],
+                    "seconds": round(stage["seconds"], 4),
+                }
+                for name, stage in sorted(
+                    self.stages.items(), key=lambda item: -item[1]["seconds"]
+                )
+            }
+            return {
+                "started_at": self.started_at.isoformat(timespec="seconds"),
+                "wall_seconds": round(time.perf_counter() - self.start, 4),
+                "stages": stages,
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def write_report(self, name: str, directory: str = METRICS_DIR) -> str:
+        """
+        Write the run report as JSON, with the profile of the slowest stage
+
+        Args:
+            name: Script name used as the report file prefix
+            directory: Folder receiving the report
+
+        Returns:
+            Path of the JSON report
+        """
+        os.makedirs(directory, exist_ok=True)
+        prefix = os.path.join(
+            directory, f"{name}_{self.started_at.strftime('%Y%m%d_%H%M%S')}"
+        )
+        report = self.report()
+
+        if self.profiles:
+            with self.lock:
+                hottest = max(self.profiles, key=lambda s: self.stages[s]["seconds"])
+                self.profiles[hottest].dump_stats(f"{prefix}.prof")
+            report["profile"] = {"stage": hottest, "path": f"{prefix}.prof"}
+
+        with open(f"{prefix}.json", "w") as f:
+            json.dump(report, f, indent=2)
+
+        print(f"Metrics report saved to: {prefix}.json")
+        for stage, values in list(report["stages"].items())[:5]:
+            print(f"  {stage:<36} {values['seconds']:>9.2f}s  {values['calls']:>7} calls")
+        return f"{prefix}.json"
+
+
+# Metrics of the current process, shared by every module
+metrics = Metrics()
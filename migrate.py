@@ -0,0 +1,79 @@
+import argparse
+import os
+
+from db import raw_connection
+
+# Folder holding the NNN_description.sql migration files
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+
+def list_migrations(directory=MIGRATIONS_DIR):
+    """Return the (version, path) of every migration file in apply order"""
+    return [
+        (os.path.splitext(name)[0], os.path.join(directory, name))
+        for name in sorted(os.listdir(directory))
+        if name.endswith(".sql")
+    ]
+
+
+def applied_migrations(conn):
+    """Return the versions already applied, creating the tracking table if needed"""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version TEXT PRIMARY KEY,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+            """
+        )
+        cursor.execute("SELECT version FROM schema_migrations")
+        applied = {row[0] for row in cursor.fetchall()}
+    conn.commit()
+    return applied
+
+
+def migrate(conn, directory=MIGRATIONS_DIR, dry_run=False):
+    """Apply pending migrations in order, each in its own transaction"""
+    applied = applied_migrations(conn)
+    pending = [m for m in list_migrations(directory) if m[0] not in applied]
+    if not pending:
+        print("Database is up to date")
+        return []
+
+    for version, path in pending:
+        if dry_run:
+            print(f"Pending {version}")
+            continue
+
+        with open(path) as f:
+            sql = f.read()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(sql)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version) VALUES (%s)", (version,)
+                )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"Error applying {version}: {str(e)}")
+            raise
+        print(f"Applied {version}")
+
+    return [version for version, _ in pending]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply the app database migrations")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="List pending migrations only"
+    )
+    args = parser.parse_args()
+
+    with raw_connection("app") as conn:
+        migrate(conn, dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
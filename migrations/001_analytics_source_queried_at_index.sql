@@ -0,0 +1,3 @@
+-- Serve the app's source filter and queried_at range/order from one index
+CREATE INDEX IF NOT EXISTS analytics_source_queried_at_idx
+    ON trends.analytics (source, queried_at);
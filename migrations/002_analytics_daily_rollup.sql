@@ -0,0 +1,11 @@
+-- Query counts per source, day and query for every complete day,
+-- refreshed incrementally by app.refresh_rollup
+CREATE TABLE IF NOT EXISTS trends.analytics_daily (
+    source TEXT,
+    day DATE NOT NULL,
+    query TEXT,
+    queries BIGINT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS analytics_daily_day_source_idx
+    ON trends.analytics_daily (day, source);
@@ -1,75 +1,350 @@
 import duckdb
 import argparse
+import csv
+import io
 import os
-import pandas as pd
+import queue
+import threading
+import time
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from contextlib import closing, nullcontext
 from pathlib import Path
-from sqlalchemy import create_engine
-from neo4j import GraphDatabase
 from dotenv import load_dotenv
+
+import backends
+from metrics import metrics
 load_dotenv()
 
+# Rows fetched from Postgres per round-trip when streaming exports
+CHUNK_SIZE = 50_000
+
+# IDs fetched from Neo4j per keyset page
+NEO4J_PAGE_SIZE = 50_000
+
+# Key ranges compared per source in incremental mode: numeric IDs are split
+# into about RANGE_COUNT ranges of equal width, string IDs by their first
+# RANGE_PREFIX characters
+RANGE_COUNT = 1000
+RANGE_PREFIX = 4
+
+# Concurrent exports allowed against each backend when processing sources
+POSTGRES_WORKERS = 2
+NEO4J_WORKERS = 2
+
+SOURCES = ["amazon", "tiktok", "shopee", "supply"]
+
+# Column type of the product ID for each source
+ID_TYPES = {
+    "amazon": "VARCHAR",
+    "shopee": "BIGINT",
+    "supply": "BIGINT",
+}
+
+PG_TYPES = {
+    "VARCHAR": "text",
+    "BIGINT": "bigint",
+}
+
+ARROW_TYPES = {
+    "VARCHAR": pa.string(),
+    "BIGINT": pa.int64(),
+}
+
+# Source-specific Postgres queries returning the distinct product IDs
+POSTGRES_QUERIES = {
+    # "amazon": """
+    #     SELECT distinct asin as id
+    #     FROM amz.products
+    # """,
+    "amazon": """
+        SELECT distinct p.asin as id
+        FROM amz.products p
+        JOIN amz.bestsellers_products bp
+            ON p.asin = bp.product_asin
+        -- where bp.bestseller_id = 3096
+    """,
+    # "tiktok": "",
+    "shopee": """
+        SELECT distinct item_id as id
+        FROM tmapi_shopee.normalized_shopee_product_details
+    """,
+    "supply": """
+        SELECT distinct product_id as id
+        FROM public.products
+    """,
+}
+
+# Source-specific Neo4j (label, id property) pairs of the loaded products
+NEO4J_NODES = {
+    "amazon": ("Bestseller", "asin"),
+    # "tiktok": "",
+    "shopee": ("ShopeeProduct", "item_id"),
+    "supply": ("Product", "product_id"),
+}
+
+
 def setup_folders():
-    sources = ["amazon", "tiktok", "shopee", "supply"]
-    for source in sources:
+    for source in SOURCES:
         Path(f"data/{source}").mkdir(parents=True, exist_ok=True)
 
 
-def get_postgres_data(source):
-    """Query Postgres database and save results to CSV."""
+def postgres_database(source):
+    """Return the name of the database holding the source products."""
+    return "app" if source == "supply" else "default"
+
+
+def range_key(column, id_type, width):
+    """Return the SQL and Cypher expression of the key range holding an ID."""
+    if id_type == "BIGINT":
+        return f"({column} - {column} % {width})"
+    return f"left({column}, {RANGE_PREFIX})"
+
+
+def range_checks(column, id_type):
+    """Return the SQL and Cypher aggregates summarizing the IDs of a key range."""
+    if id_type == "BIGINT":
+        checks = f"sum({column}), sum(({column} % 65521) * ({column} % 65521))"
+    else:
+        # Cypher has no hash function, string ranges compare their bounds
+        checks = f"min({column}), max({column})"
+    return f"count(*), {checks}"
+
+
+def iter_postgres_ids(source, chunk_size=CHUNK_SIZE, ranges=None, width=None):
+    """Yield the source IDs from Postgres in chunks through a server-side cursor.
+
+    With `ranges`, only the IDs of those key ranges are yielded.
+    """
+    query = POSTGRES_QUERIES[source]
+    if ranges is not None:
+        key = range_key("q.id", ID_TYPES[source], width).replace("%", "%%")
+        query = f"SELECT q.id FROM ({query}) q WHERE {key} = ANY(%(ranges)s)"
+    query += " ORDER BY id"
+
+    conn = backends.postgres_connection(postgres_database(source))
     try:
-        # PostgreSQL connection parameters from environment variables
-        pg_params = {
-            "host": os.getenv("PG_HOST", "localhost"),
-            "database": (
-                os.getenv("PG_DATABASE")
-                if source != "supply"
-                else os.getenv("PG_DATABASE_APP")
-            ),
-            "user": os.getenv("PG_USER"),
-            "password": os.getenv("PG_PASSWORD"),
-            "port": os.getenv("PG_PORT", "5432"),
-        }
+        # A named cursor keeps the result on the server, only one chunk is
+        # held in memory at a time
+        with conn.cursor(name=f"{source}_ids") as cursor:
+            cursor.itersize = chunk_size
+            cursor.execute(query, {"ranges": ranges})
+            while True:
+                with metrics.stage(f"{source}.postgres_fetch"):
+                    rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                metrics.count(f"{source}.postgres_rows", len(rows))
+                yield [row[0] for row in rows]
+    finally:
+        conn.close()
 
-        # Source-specific queries
-        queries = {
-            # "amazon": """
-            #     SELECT distinct asin as id
-            #     FROM amz.products
-            #     ORDER BY id;
-            # """,
-            "amazon": """
-                SELECT distinct p.asin as id
-                FROM amz.products p
-                JOIN amz.bestsellers_products bp
-                    ON p.asin = bp.product_asin
-                -- where bp.bestseller_id = 3096
-                ORDER BY id;
-            """,
-            # "tiktok": "",
-            "shopee": """
-                SELECT distinct item_id as id
-                FROM tmapi_shopee.normalized_shopee_product_details
-                ORDER BY id;
-            """,
-            "supply": """
-                SELECT distinct product_id as id
-                FROM public.products
-                ORDER BY id;
-            """,
-        }
 
-        # Create SQLAlchemy engine
-        engine = create_engine(
-            f"postgresql://{pg_params['user']}:{pg_params['password']}@"
-            f"{pg_params['host']}:{pg_params['port']}/{pg_params['database']}"
-        )
+def iter_neo4j_ids(
+    source,
+    after=None,
+    upto=None,
+    page_size=NEO4J_PAGE_SIZE,
+    driver=None,
+    ranges=None,
+    width=None,
+):
+    """Yield the loaded IDs from Neo4j one page at a time.
+
+    Pages are keyed on the ID property (`id > $last`), so every query is a
+    bounded range scan instead of a full label sort. `after` and `upto` bound
+    the scanned range, exclusive and inclusive respectively. With `ranges`,
+    only the IDs of those key ranges are yielded.
+    """
+    label, key = NEO4J_NODES[source]
+    conditions = [f"n.{key} IS NOT NULL"]
+    if upto is not None:
+        conditions.append(f"n.{key} <= $upto")
+    if ranges is not None:
+        conditions.append(f"{range_key(f'n.{key}', ID_TYPES[source], width)} IN $ranges")
+    first_page = " AND ".join(conditions)
+    next_page = " AND ".join(conditions + [f"n.{key} > $last"])
+    query = "MATCH (n:{label}) WHERE {where} RETURN n.{key} as id order by id LIMIT $limit"
+
+    own_driver = driver is None
+    if own_driver:
+        driver = backends.neo4j_driver()
+
+    try:
+        with driver.session() as session:
+            last = after
+            while True:
+                where = first_page if last is None else next_page
+                with metrics.stage(f"{source}.neo4j_fetch"):
+                    result = session.run(
+                        query.format(label=label, where=where, key=key),
+                        last=last,
+                        upto=upto,
+                        ranges=ranges,
+                        limit=page_size,
+                    )
+                    page = [record["id"] for record in result]
+                metrics.count(f"{source}.neo4j_rows", len(page))
+                if not page:
+                    break
+                yield page
+                if len(page) < page_size:
+                    break
+                last = page[-1]
+    finally:
+        if own_driver:
+            driver.close()
+
+
+def iter_neo4j_ids_parallel(source, sessions, page_size=NEO4J_PAGE_SIZE):
+    """Yield pages of loaded IDs read by several Neo4j sessions in parallel.
+
+    The numeric ID range is split into one slice per session. Pages are
+    yielded as they arrive, in no particular order, and at most two pages per
+    session are buffered.
+    """
+    label, key = NEO4J_NODES[source]
+    pages = queue.Queue(maxsize=2 * sessions)
+    done = object()
+
+    with backends.neo4j_driver() as driver:
+        with driver.session() as session:
+            lo, hi = session.run(
+                f"MATCH (n:{label}) RETURN min(n.{key}) as lo, max(n.{key}) as hi"
+            ).single()
+        if lo is None:
+            return
+
+        lo -= 1
+        step = -(-(hi - lo) // sessions)
+        ranges = [(start, min(start + step, hi)) for start in range(lo, hi, step)]
+
+        # Set when the consumer stops or a reader fails, so the other readers
+        # stop instead of blocking on a full queue
+        stop = threading.Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def read_range(after, upto):
+            try:
+                with closing(
+                    iter_neo4j_ids(source, after, upto, page_size, driver)
+                ) as reader:
+                    for page in reader:
+                        if not put(page):
+                            break
+            except Exception as e:
+                put(e)
+            finally:
+                put(done)
+
+        threads = [
+            threading.Thread(target=read_range, args=id_range, daemon=True)
+            for id_range in ranges
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            running = len(threads)
+            while running:
+                page = pages.get()
+                if page is done:
+                    running -= 1
+                elif isinstance(page, Exception):
+                    raise page
+                else:
+                    yield page
+        finally:
+            # Release the readers and wait for them before the driver closes
+            stop.set()
+            for thread in threads:
+                while thread.is_alive():
+                    try:
+                        pages.get_nowait()
+                    except queue.Empty:
+                        thread.join(0.1)
+
+
+def collect_ids(chunks, id_type):
+    """Collect chunks of IDs into an Arrow table with an explicit ID type."""
+    schema = pa.schema([("id", ARROW_TYPES[id_type])])
+    batches = [
+        pa.record_batch([pa.array(chunk, schema.field("id").type)], schema=schema)
+        for chunk in chunks
+    ]
+    return pa.Table.from_batches(batches, schema=schema)
 
-        # Execute query and save to CSV
-        query = queries[source]
-        df = pd.read_sql_query(query, engine)
-        output_file = f"data/{source}/full.csv"
-        df.to_csv(output_file, index=False)
-        print(f"Exported {len(df)} records from Postgres to {output_file}")
+
+def write_ids(chunks, output_file, id_type, fmt="csv"):
+    """Write chunks of IDs to a CSV or Parquet file without holding them all.
+
+    The file is written next to the output and only replaces it once every
+    chunk is written, so a failed export keeps the previous file. Returns the
+    number of rows written.
+    """
+    start = time.perf_counter()
+    rows = 0
+    partial_file = f"{output_file}.partial"
+
+    try:
+        if fmt == "parquet":
+            schema = pa.schema([("id", ARROW_TYPES[id_type])])
+            with pq.ParquetWriter(partial_file, schema) as writer:
+                for chunk in chunks:
+                    with metrics.stage("serialize"):
+                        writer.write_table(pa.table({"id": chunk}, schema=schema))
+                    rows += len(chunk)
+        else:
+            with open(partial_file, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["id"])
+                for chunk in chunks:
+                    with metrics.stage("serialize"):
+                        writer.writerows([id] for id in chunk)
+                    rows += len(chunk)
+        os.replace(partial_file, output_file)
+    finally:
+        if os.path.exists(partial_file):
+            os.remove(partial_file)
+    metrics.count("rows_written", rows)
+    metrics.count("bytes_written", os.path.getsize(output_file))
+
+    elapsed = time.perf_counter() - start
+    rate = rows / elapsed if elapsed > 0 else 0
+    print(f"Wrote {rows} rows to {output_file} in {elapsed:.1f}s ({rate:,.0f} rows/s)")
+    return rows
+
+
+def write_table(table, output_file):
+    """Write an Arrow table of IDs to CSV or Parquet, based on the file name."""
+    if output_file.endswith(".parquet"):
+        pq.write_table(table, output_file)
+    else:
+        pa_csv.write_csv(table, output_file)
+    print(f"Wrote {table.num_rows} rows to {output_file}")
+
+
+def get_postgres_data(source, fmt="csv", chunk_size=CHUNK_SIZE):
+    """Query Postgres database and stream results to CSV or Parquet."""
+    try:
+        output_file = f"data/{source}/full.{fmt}"
+        rows = write_ids(
+            iter_postgres_ids(source, chunk_size=chunk_size),
+            output_file,
+            ID_TYPES[source],
+            fmt,
+        )
+        print(f"Exported {rows} records from Postgres to {output_file}")
 
         return output_file
 
@@ -78,69 +353,143 @@ def get_postgres_data(source):
         raise
 
 
-def get_neo4j_data(source):
-    """Query Neo4j database and save results to CSV."""
+def get_postgres_table(source, chunk_size=CHUNK_SIZE):
+    """Query Postgres database into an in-memory Arrow table."""
     try:
-        # Neo4j connection parameters from environment variables
-        neo4j_uri = os.getenv("NEO4J_URI")
-        neo4j_user = os.getenv("NEO4J_USER")
-        neo4j_password = os.getenv("NEO4J_PASSWORD")
-
-        # Source-specific queries
-        queries = {
-            "amazon": "MATCH (n:Bestseller) RETURN n.asin as id order by id",
-            # "tiktok": "",
-            "shopee": "MATCH (n:ShopeeProduct) RETURN n.item_id as id order by id",
-            "supply": "MATCH (n:Product) RETURN n.product_id as id order by id",
-        }
+        table = collect_ids(
+            iter_postgres_ids(source, chunk_size=chunk_size), ID_TYPES[source]
+        )
+        print(f"Exported {table.num_rows} records from Postgres into memory")
+
+        return table
 
-        # Connect to Neo4j
-        with GraphDatabase.driver(
-            neo4j_uri, auth=(neo4j_user, neo4j_password)
-        ) as driver:
-            with driver.session() as session:
-                result = session.run(queries[source])
-                data = [record["id"] for record in result]
+    except Exception as e:
+        print(f"Error querying Postgres: {str(e)}")
+        raise
 
-                # Create DataFrame and save to CSV
-                df = pd.DataFrame(data, columns=["id"])
-                output_file = f"data/{source}/loaded.csv"
-                df.to_csv(output_file, index=False)
-                print(f"Exported {len(df)} records from Neo4j to {output_file}")
 
-                return output_file
+def iter_neo4j_pages(source, page_size=NEO4J_PAGE_SIZE, sessions=1):
+    """Yield pages of loaded IDs, read in parallel when the IDs allow it."""
+    # Parallel reads split the ID range, which only works for numeric IDs
+    if sessions > 1 and ID_TYPES[source] == "BIGINT":
+        return iter_neo4j_ids_parallel(source, sessions, page_size)
+    return iter_neo4j_ids(source, page_size=page_size)
+
+
+def get_neo4j_data(source, fmt="csv", page_size=NEO4J_PAGE_SIZE, sessions=1):
+    """Query Neo4j database page by page and save results to CSV or Parquet."""
+    try:
+        output_file = f"data/{source}/loaded.{fmt}"
+        rows = write_ids(
+            iter_neo4j_pages(source, page_size, sessions),
+            output_file,
+            ID_TYPES[source],
+            fmt,
+        )
+        print(f"Exported {rows} records from Neo4j to {output_file}")
+
+        return output_file
 
     except Exception as e:
         print(f"Error querying Neo4j: {str(e)}")
         raise
 
 
-def process_data(source):
-    """Process data for a specific source."""
+def get_neo4j_table(source, page_size=NEO4J_PAGE_SIZE, sessions=1):
+    """Query Neo4j database page by page into an in-memory Arrow table."""
+    try:
+        table = collect_ids(
+            iter_neo4j_pages(source, page_size, sessions), ID_TYPES[source]
+        )
+        print(f"Exported {table.num_rows} records from Neo4j into memory")
+
+        return table
+
+    except Exception as e:
+        print(f"Error querying Neo4j: {str(e)}")
+        raise
+
+
+def read_ids_sql(path, id_type):
+    """Return the DuckDB table function reading an exported ID file."""
+    if path.endswith(".parquet"):
+        return f"read_parquet('{path}')"
+    # Explicit column types skip the CSV sniffer
+    return f"read_csv('{path}', header = true, columns = {{'id': '{id_type}'}})"
+
+
+def process_data(
+    source,
+    fmt="csv",
+    chunk_size=CHUNK_SIZE,
+    page_size=NEO4J_PAGE_SIZE,
+    neo4j_sessions=1,
+    in_memory=False,
+    debug_files=False,
+    engine="duckdb",
+):
+    """Process data for a specific source.
+
+    With `in_memory` the exported IDs are handed to DuckDB as Arrow tables
+    and full/loaded files are only written when `debug_files` is set. The
+    "postgres" engine computes the difference on the Postgres server instead.
+    """
+    if engine == "postgres":
+        with metrics.stage(f"{source}.pushdown"):
+            diff_in_postgres(source, page_size, neo4j_sessions)
+    elif in_memory:
+        with metrics.stage(f"{source}.postgres"):
+            full = get_postgres_table(source, chunk_size)
+        with metrics.stage(f"{source}.neo4j"):
+            loaded = get_neo4j_table(source, page_size, neo4j_sessions)
+        with metrics.stage(f"{source}.diff"):
+            diff_ids(source, full, loaded, fmt if debug_files else None)
+    else:
+        # full = os.path.join(data_folder, "full.csv")
+        with metrics.stage(f"{source}.postgres"):
+            full = get_postgres_data(source, fmt, chunk_size)
+        # loaded = os.path.join(data_folder, "loaded.csv")
+        with metrics.stage(f"{source}.neo4j"):
+            loaded = get_neo4j_data(source, fmt, page_size, neo4j_sessions)
+        with metrics.stage(f"{source}.diff"):
+            diff_ids(source, full, loaded)
+
+
+def diff_ids(source, full, loaded, debug_fmt=None):
+    """Save the IDs of `full` missing from `loaded` to unprocessed.csv.
+
+    `full` and `loaded` are either paths to exported ID files or Arrow tables.
+    Tables are registered with DuckDB directly and, when `debug_fmt` is set,
+    also written to full/loaded files of that format.
+    """
     # Define file paths
     data_folder = f"data/{source}"
-    # full = os.path.join(data_folder, "full.csv")
-    full = get_postgres_data(source)
-    # loaded = os.path.join(data_folder, "loaded.csv")
-    loaded = get_neo4j_data(source)
     unprocessed = os.path.join(data_folder, "unprocessed.csv")
-
-    # Validate input files exist
-    if not os.path.exists(full):
-        raise FileNotFoundError(f"Full products file not found for {source}: {full}")
-    if not os.path.exists(loaded):
-        raise FileNotFoundError(
-            f"Loaded products file not found for {source}: {loaded}"
-        )
+    id_type = ID_TYPES[source]
 
     # Open a DuckDB connection
     con = duckdb.connect()
 
+    relations = {}
+    for name, ids in (("full", full), ("loaded", loaded)):
+        if isinstance(ids, pa.Table):
+            con.register(f"{name}_ids", ids)
+            relations[name] = f"{name}_ids"
+            if debug_fmt:
+                write_table(ids, os.path.join(data_folder, f"{name}.{debug_fmt}"))
+        elif os.path.exists(ids):
+            relations[name] = read_ids_sql(ids, id_type)
+        else:
+            con.close()
+            raise FileNotFoundError(
+                f"{name.capitalize()} products file not found for {source}: {ids}"
+            )
+
     # Query to find unprocessed items
     query = f"""
     SELECT o.id as id
-    FROM read_csv_auto('{full}') as o
-    LEFT JOIN read_csv_auto('{loaded}') as l
+    FROM {relations["full"]} as o
+    LEFT JOIN {relations["loaded"]} as l
     ON o.id = l.id
     WHERE l.id is null
     -- ORDER BY RANDOM()
@@ -148,40 +497,509 @@ def process_data(source):
 
     try:
         # Execute the query and save results
-        result = con.execute(query).fetchdf()
-        result.to_csv(unprocessed, index=False)
+        rows = con.execute(f"COPY ({query}) TO '{unprocessed}' (HEADER)").fetchone()[0]
+        metrics.count(f"{source}.unprocessed", rows)
         print(f"Processed {source} data:")
-        print(f"Found {len(result)} unprocessed items")
+        print(f"Found {rows} unprocessed items")
         print(f"Results saved to: {unprocessed}")
     except Exception as e:
         print(f"Error processing {source} data: {str(e)}")
+        raise
     finally:
         con.close()
 
 
+def diff_in_postgres(source, page_size=NEO4J_PAGE_SIZE, neo4j_sessions=1):
+    """Compute the unprocessed IDs on the Postgres server.
+
+    The loaded IDs are streamed from Neo4j into a temp table with COPY and
+    anti-joined against the source query in Postgres, so the full product
+    list never leaves the database and only unprocessed IDs are returned.
+    """
+    data_folder = f"data/{source}"
+    unprocessed = os.path.join(data_folder, "unprocessed.csv")
+    pg_type = PG_TYPES[ID_TYPES[source]]
+
+    conn = backends.postgres_connection(postgres_database(source))
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMP TABLE loaded_ids (id {pg_type}) ON COMMIT DROP"
+            )
+
+            loaded = 0
+            for page in iter_neo4j_pages(source, page_size, neo4j_sessions):
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows([id] for id in page)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    "COPY loaded_ids (id) FROM STDIN WITH (FORMAT csv)", buffer
+                )
+                loaded += len(page)
+            cursor.execute("ANALYZE loaded_ids")
+            print(f"Staged {loaded} records from Neo4j in Postgres")
+
+            # Query to find unprocessed items
+            query = f"""
+            SELECT o.id as id
+            FROM ({POSTGRES_QUERIES[source]}) as o
+            WHERE NOT EXISTS (SELECT 1 FROM loaded_ids l WHERE l.id = o.id)
+            """
+            with open(unprocessed, "w", newline="") as f:
+                cursor.copy_expert(
+                    f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", f
+                )
+        conn.commit()
+
+        with open(unprocessed) as f:
+            rows = sum(1 for _ in f) - 1
+        print(f"Processed {source} data in Postgres:")
+        print(f"Found {rows} unprocessed items")
+        print(f"Results saved to: {unprocessed}")
+    except Exception as e:
+        print(f"Error processing {source} data: {str(e)}")
+        raise
+    finally:
+        conn.close()
+
+
+def process_all(
+    sources,
+    fmt="csv",
+    chunk_size=CHUNK_SIZE,
+    postgres_workers=POSTGRES_WORKERS,
+    neo4j_workers=NEO4J_WORKERS,
+    page_size=NEO4J_PAGE_SIZE,
+    neo4j_sessions=1,
+    in_memory=False,
+    debug_files=False,
+    engine="duckdb",
+):
+    """Process several sources concurrently.
+
+    The Postgres and Neo4j exports of every source run at the same time, with
+    at most `postgres_workers` and `neo4j_workers` exports in flight against
+    each backend. A failing source does not stop the others. Prints the time
+    spent in each stage per source and returns the errors keyed by source.
+    See `process_data` for `in_memory`, `debug_files` and `engine`.
+    """
+    limits = {
+        "postgres": threading.Semaphore(postgres_workers),
+        "neo4j": threading.Semaphore(neo4j_workers),
+    }
+    # The pushdown engine keeps a Postgres connection for its whole run
+    limits["pushdown"] = limits["postgres"]
+    timings = {source: {} for source in sources}
+    errors = {}
+
+    def timed(source, stage, func, *args):
+        with limits.get(stage, nullcontext()), metrics.stage(f"{source}.{stage}"):
+            start = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                timings[source][stage] = time.perf_counter() - start
+
+    def run_source(source):
+        start = time.perf_counter()
+        try:
+            if engine == "postgres":
+                timed(
+                    source,
+                    "pushdown",
+                    diff_in_postgres,
+                    source,
+                    page_size,
+                    neo4j_sessions,
+                )
+                return
+
+            if in_memory:
+                full_args = (get_postgres_table, source, chunk_size)
+                loaded_args = (get_neo4j_table, source, page_size, neo4j_sessions)
+                debug_fmt = fmt if debug_files else None
+            else:
+                full_args = (get_postgres_data, source, fmt, chunk_size)
+                loaded_args = (get_neo4j_data, source, fmt, page_size, neo4j_sessions)
+                debug_fmt = None
+
+            full = export_pool.submit(timed, source, "postgres", *full_args)
+            loaded = export_pool.submit(timed, source, "neo4j", *loaded_args)
+            wait([full, loaded])
+            timed(
+                source,
+                "diff",
+                diff_ids,
+                source,
+                full.result(),
+                loaded.result(),
+                debug_fmt,
+            )
+        finally:
+            timings[source]["total"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=2 * len(sources)) as export_pool:
+        with ThreadPoolExecutor(max_workers=len(sources)) as source_pool:
+            futures = {source_pool.submit(run_source, s): s for s in sources}
+            for future in as_completed(futures):
+                source = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    errors[source] = e
+                    print(f"Error with {source}: {str(e)}")
+    elapsed = time.perf_counter() - start
+
+    stages = [
+        stage
+        for stage in ["postgres", "neo4j", "pushdown", "diff", "total"]
+        if any(stage in timings[source] for source in sources)
+    ]
+    print(f"\n{'source':<10}" + "".join(f"{stage:>10}" for stage in stages) + "  status")
+    for source in sources:
+        row = "".join(
+            f"{timings[source][stage]:>9.1f}s" if stage in timings[source] else f"{'-':>10}"
+            for stage in stages
+        )
+        status = "error" if source in errors else "ok"
+        print(f"{source:<10}{row}  {status}")
+    print(f"Processed {len(sources)} sources in {elapsed:.1f}s")
+
+    return errors
+
+
+def range_signature(values):
+    """Join the aggregates of a key range into the string compared across runs."""
+    return ":".join(str(value) for value in values)
+
+
+def range_width(source):
+    """Return the width of the numeric key ranges of a source, from its ID bounds."""
+    if ID_TYPES[source] != "BIGINT":
+        return 0
+
+    query = f"SELECT min(q.id), max(q.id) FROM ({POSTGRES_QUERIES[source]}) q"
+    conn = backends.postgres_connection(postgres_database(source))
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(query)
+            lo, hi = cursor.fetchone()
+    finally:
+        conn.close()
+    if lo is None:
+        return 1
+    return max(1, -(-(hi - lo + 1) // RANGE_COUNT))
+
+
+def postgres_ranges(source, width):
+    """Return the signature of every key range of the source IDs, computed in Postgres."""
+    id_type = ID_TYPES[source]
+    query = f"""
+        SELECT {range_key("q.id", id_type, width)} as range_key, {range_checks("q.id", id_type)}
+        FROM ({POSTGRES_QUERIES[source]}) q
+        GROUP BY 1
+    """
+    conn = backends.postgres_connection(postgres_database(source))
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(query)
+            return {row[0]: range_signature(row[1:]) for row in cursor.fetchall()}
+    finally:
+        conn.close()
+
+
+def neo4j_ranges(source, width):
+    """Return the signature of every key range of the loaded IDs, computed in Neo4j."""
+    label, key = NEO4J_NODES[source]
+    id_type = ID_TYPES[source]
+    column = f"n.{key}"
+    query = (
+        f"MATCH (n:{label}) WHERE {column} IS NOT NULL "
+        f"RETURN {range_key(column, id_type, width)} as range_key, "
+        f"{range_checks(column, id_type)}"
+    )
+    with backends.neo4j_driver() as driver:
+        with driver.session() as session:
+            return {
+                record[0]: range_signature(list(record)[1:])
+                for record in session.run(query)
+            }
+
+
+def insert_ids(con, table, chunks, id_type):
+    """Stream chunks of IDs into a DuckDB table, returning the row count."""
+    schema = pa.schema([("id", ARROW_TYPES[id_type])])
+    rows = 0
+    for chunk in chunks:
+        con.register("chunk", pa.table({"id": chunk}, schema=schema))
+        con.execute(f"INSERT INTO {table} SELECT id FROM chunk")
+        con.unregister("chunk")
+        rows += len(chunk)
+    return rows
+
+
+def sync_ranges(con, side, ranges, export, id_type, width):
+    """Update the IDs kept for one side from the key ranges that changed.
+
+    `ranges` maps every current key range to its signature and `export`
+    yields the IDs of a list of key ranges. Ranges whose signature differs
+    from the kept one have their IDs replaced, in one transaction. Returns
+    the number of changed ranges and of IDs added and removed.
+    """
+    key = range_key("id", id_type, width)
+    stored = dict(con.execute(f"SELECT * FROM {side}_ranges").fetchall())
+    changed = [
+        range_id
+        for range_id in ranges.keys() | stored.keys()
+        if ranges.get(range_id) != stored.get(range_id)
+    ]
+    if not changed:
+        return 0, 0, 0
+
+    con.execute("BEGIN TRANSACTION")
+    try:
+        in_changed = f"{key} IN (SELECT unnest(?))"
+        con.execute(
+            f"CREATE OR REPLACE TEMP TABLE previous_ids AS "
+            f"SELECT id FROM {side}_ids WHERE {in_changed}",
+            [changed],
+        )
+        con.execute(f"DELETE FROM {side}_ids WHERE {in_changed}", [changed])
+        exported = [range_id for range_id in changed if range_id in ranges]
+        if exported:
+            insert_ids(con, f"{side}_ids", export(exported), id_type)
+        added, removed = con.execute(
+            f"""
+            SELECT
+                (SELECT count(*) FROM (
+                    SELECT id FROM {side}_ids WHERE {in_changed}
+                    EXCEPT SELECT id FROM previous_ids
+                )),
+                (SELECT count(*) FROM (
+                    SELECT id FROM previous_ids
+                    EXCEPT SELECT id FROM {side}_ids WHERE {in_changed}
+                ))
+            """,
+            [changed, changed],
+        ).fetchone()
+
+        signatures = pa.table(
+            {
+                "range_key": pa.array(list(ranges), ARROW_TYPES[id_type]),
+                "signature": pa.array(list(ranges.values()), pa.string()),
+            }
+        )
+        con.register("signatures", signatures)
+        con.execute(f"DELETE FROM {side}_ranges")
+        con.execute(f"INSERT INTO {side}_ranges SELECT * FROM signatures")
+        con.unregister("signatures")
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    return len(changed), added, removed
+
+
+def process_incremental(
+    source, full_refresh=False, chunk_size=CHUNK_SIZE, page_size=NEO4J_PAGE_SIZE
+):
+    """Process a source, exporting only the key ranges changed since the last run.
+
+    The IDs of both sides are kept in a per-source DuckDB state file with a
+    signature per key range: its ID count and checksums, computed by Postgres
+    and Neo4j themselves (see range_checks). A run fetches the signatures,
+    exports only the IDs of the ranges whose signature changed, both sides
+    concurrently, and recomputes unprocessed.csv from the kept IDs. A change
+    keeping a range's signature, such as a string ID replaced by another
+    between the same bounds, is only picked up by `full_refresh`, which
+    discards the state first.
+    """
+    data_folder = f"data/{source}"
+    state_file = os.path.join(data_folder, "state.duckdb")
+    unprocessed = os.path.join(data_folder, "unprocessed.csv")
+    id_type = ID_TYPES[source]
+    sides = ("full", "loaded")
+
+    con = duckdb.connect(state_file)
+
+    try:
+        if full_refresh:
+            con.execute("DROP TABLE IF EXISTS range_width")
+        con.execute("CREATE TABLE IF NOT EXISTS range_width (width BIGINT)")
+        row = con.execute("SELECT width FROM range_width").fetchone()
+        if row is None:
+            # Ranges kept with another width do not line up, start over
+            width = range_width(source)
+            for side in sides:
+                con.execute(f"DROP TABLE IF EXISTS {side}_ids")
+                con.execute(f"DROP TABLE IF EXISTS {side}_ranges")
+            con.execute("INSERT INTO range_width VALUES (?)", [width])
+        else:
+            width = row[0]
+        for side in sides:
+            con.execute(f"CREATE TABLE IF NOT EXISTS {side}_ids (id {id_type})")
+            con.execute(
+                f"CREATE TABLE IF NOT EXISTS {side}_ranges "
+                f"(range_key {id_type}, signature VARCHAR)"
+            )
+
+        exports = {
+            "full": (
+                "Postgres",
+                postgres_ranges,
+                lambda ranges: iter_postgres_ids(source, chunk_size, ranges, width),
+            ),
+            "loaded": (
+                "Neo4j",
+                neo4j_ranges,
+                lambda ranges: iter_neo4j_ids(
+                    source, page_size=page_size, ranges=ranges, width=width
+                ),
+            ),
+        }
+
+        def sync(side):
+            name, get_ranges, export = exports[side]
+            with metrics.stage(f"{source}.{name.lower()}"):
+                ranges = get_ranges(source, width)
+                with closing(con.cursor()) as cursor:
+                    changed, added, removed = sync_ranges(
+                        cursor, side, ranges, export, id_type, width
+                    )
+            metrics.count(f"{source}.changed_ranges", changed)
+            print(
+                f"{name}: {changed} of {len(ranges)} key ranges changed, "
+                f"{added} IDs added and {removed} removed since the last run"
+            )
+
+        with ThreadPoolExecutor(max_workers=len(sides)) as pool:
+            for future in [pool.submit(sync, side) for side in sides]:
+                future.result()
+
+        # Query to find unprocessed items
+        query = """
+        SELECT DISTINCT o.id as id
+        FROM full_ids as o
+        LEFT JOIN loaded_ids as l
+        ON o.id = l.id
+        WHERE l.id is null
+        """
+
+        rows = con.execute(f"COPY ({query}) TO '{unprocessed}' (HEADER)").fetchone()[0]
+        print(f"Processed {source} data incrementally:")
+        print(f"Found {rows} unprocessed items")
+        print(f"Results saved to: {unprocessed}")
+    except Exception as e:
+        print(f"Error processing {source} data: {str(e)}")
+        raise
+    finally:
+        con.close()
+
 def main():
     # Set up argument parser
     parser = argparse.ArgumentParser(description="Process different data sources")
     parser.add_argument(
         "source",
-        choices=["amazon", "tiktok", "shopee", "supply", "all"],
+        choices=SOURCES + ["all"],
         help="Data source to process",
     )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only export the key ranges changed since the last run (state in data/<source>/state.duckdb)",
+    )
+    parser.add_argument(
+        "--full-refresh",
+        action="store_true",
+        help="With --incremental, discard the state kept from the last run",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["csv", "parquet"],
+        default="csv",
+        help="File format of the exported full/loaded ID files",
+    )
+    parser.add_argument(
+        "--in-memory",
+        action="store_true",
+        help="Hand exported IDs to DuckDB as Arrow tables instead of files",
+    )
+    parser.add_argument(
+        "--debug-files",
+        action="store_true",
+        help="With --in-memory, still write the full/loaded ID files",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=["duckdb", "postgres"],
+        default="duckdb",
+        help="Where to compute unprocessed IDs: locally in DuckDB or in Postgres",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=CHUNK_SIZE,
+        help="Rows fetched from Postgres per round-trip",
+    )
+    parser.add_argument(
+        "--postgres-workers",
+        type=int,
+        default=POSTGRES_WORKERS,
+        help="Maximum concurrent Postgres exports",
+    )
+    parser.add_argument(
+        "--neo4j-workers",
+        type=int,
+        default=NEO4J_WORKERS,
+        help="Maximum concurrent Neo4j exports",
+    )
+    parser.add_argument(
+        "--neo4j-page-size",
+        type=int,
+        default=NEO4J_PAGE_SIZE,
+        help="IDs fetched from Neo4j per page",
+    )
+    parser.add_argument(
+        "--neo4j-sessions",
+        type=int,
+        default=1,
+        help="Parallel Neo4j sessions per export (numeric IDs only)",
+    )
 
     # Parse arguments
     args = parser.parse_args()
 
-    # Process selected source or all sources
-    if args.source == "all":
-        sources = ["amazon", "tiktok", "shopee", "supply"]
+    sources = SOURCES if args.source == "all" else [args.source]
+
+    if args.incremental or args.full_refresh:
         for source in sources:
             print(f"\nProcessing {source}...")
             try:
-                process_data(source)
+                process_incremental(
+                    source,
+                    args.full_refresh,
+                    args.chunk_size,
+                    args.neo4j_page_size,
+                )
             except Exception as e:
                 print(f"Error with {source}: {str(e)}")
     else:
-        process_data(args.source)
+        # Exports of all selected sources run concurrently
+        process_all(
+            sources,
+            args.format,
+            args.chunk_size,
+            args.postgres_workers,
+            args.neo4j_workers,
+            args.neo4j_page_size,
+            args.neo4j_sessions,
+            args.in_memory,
+            args.debug_files,
+            args.engine,
+        )
+
+    metrics.write_report("process")
 
 
 if __name__ == "__main__":
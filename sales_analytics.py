@@ -0,0 +1,107 @@
+import argparse
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from sales_store import SalesStore
+
+
+def score_asins(daily: pd.DataFrame, window: int = 7) -> pd.DataFrame:
+    """
+    Compute sales metrics for many ASINs at once from their daily sales rows
+
+    Every metric is a grouped aggregation over the whole frame, there is no
+    per-ASIN Python loop. ASINs without a single day of sales get an average
+    daily sales of 0 instead of a division error.
+
+    Args:
+        daily: Rows with asin, date, estimated_units_sold and last_known_price
+        window: Number of most recent days averaged into recent_daily_sales
+
+    Returns:
+        DataFrame indexed by ASIN with total_units, active_days, days,
+        average_daily_sales, revenue, recent_daily_sales and trend (least
+        squares slope of units sold per day)
+    """
+    daily = daily.sort_values(["asin", "date"])
+    units = daily["estimated_units_sold"].astype(float)
+    grouped = units.groupby(daily["asin"])
+
+    # Days since each ASIN's first date, the x axis of the trend
+    dates = pd.to_datetime(daily["date"])
+    x = (dates - dates.groupby(daily["asin"]).transform("min")).dt.days.astype(float)
+
+    sums = pd.DataFrame(
+        {
+            "n": grouped.size(),
+            "x": x.groupby(daily["asin"]).sum(),
+            "y": grouped.sum(),
+            "xy": (x * units).groupby(daily["asin"]).sum(),
+            "xx": (x * x).groupby(daily["asin"]).sum(),
+        }
+    )
+    denominator = sums["n"] * sums["xx"] - sums["x"] ** 2
+    trend = (sums["n"] * sums["xy"] - sums["x"] * sums["y"]) / denominator.where(
+        denominator != 0
+    )
+
+    active_days = (units > 0).groupby(daily["asin"]).sum()
+    revenue = (units * daily["last_known_price"].fillna(0)).groupby(daily["asin"]).sum()
+    recent = grouped.rolling(window, min_periods=1).mean().groupby(level=0).last()
+
+    scores = pd.DataFrame(
+        {
+            "total_units": sums["y"],
+            "active_days": active_days,
+            "days": sums["n"],
+            "average_daily_sales": np.divide(
+                sums["y"],
+                active_days,
+                out=np.zeros(len(sums)),
+                where=active_days.to_numpy() > 0,
+            ),
+            "revenue": revenue,
+            "recent_daily_sales": recent,
+            "trend": trend.fillna(0),
+        }
+    )
+    scores.index.name = "asin"
+    return scores
+
+
+def load_scores(
+    asins: List[str] = None, store: SalesStore = None, window: int = 7
+) -> pd.DataFrame:
+    """
+    Load the daily sales of many ASINs from the sales store and score them
+
+    Args:
+        asins: ASINs to score (default: every stored ASIN)
+        store: Sales store to read from (default: the standard store file)
+        window: Number of most recent days averaged into recent_daily_sales
+
+    Returns:
+        DataFrame of scores, see score_asins
+    """
+    store = store or SalesStore()
+    return score_asins(store.daily_sales(asins), window)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score ASINs from stored sales")
+    parser.add_argument("asins", nargs="*", help="ASINs to score (default: all)")
+    parser.add_argument("--window", type=int, default=7, help="Recent days window")
+    parser.add_argument("--sort", default="revenue", help="Column to rank by")
+    parser.add_argument("--output", help="Optional CSV file for the scores")
+    args = parser.parse_args()
+
+    scores = load_scores(args.asins or None, window=args.window)
+    scores = scores.sort_values(args.sort, ascending=False)
+    print(scores.head(20))
+    if args.output:
+        scores.to_csv(args.output)
+
+
+if __name__ == "__main__":
+    main()
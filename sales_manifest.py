@@ -0,0 +1,212 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import List, Set, Tuple
+
+
+class SalesManifest:
+    """
+    SQLite index of the JungleScout sales estimate files fetched per ASIN
+    """
+
+    def __init__(self, path: str = "data/junglescout_manifest.sqlite"):
+        """
+        Open or create the manifest
+
+        Args:
+            path: Path of the SQLite file
+        """
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS asins (
+                asin TEXT PRIMARY KEY,
+                start_date TEXT,
+                end_date TEXT,
+                status TEXT NOT NULL,
+                bytes INTEGER,
+                checksum TEXT,
+                fetched_at TEXT NOT NULL
+            )
+            """
+        )
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS fetched_ranges (
+                asin TEXT NOT NULL,
+                start_date TEXT NOT NULL,
+                end_date TEXT NOT NULL
+            )
+            """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS fetched_ranges_asin ON fetched_ranges (asin)"
+        )
+
+    def _upsert(self, asin, start_date, end_date, status, size=None, checksum=None):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO asins VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    asin,
+                    start_date,
+                    end_date,
+                    status,
+                    size,
+                    checksum,
+                    datetime.now().isoformat(timespec="seconds"),
+                ),
+            )
+
+    def record(self, asin: str, start_date: str, end_date: str, path: str):
+        """
+        Record a stored sales estimate file, empty files are marked incomplete
+
+        Args:
+            asin: The product ASIN
+            start_date: First date of the fetched window
+            end_date: Last date of the fetched window
+            path: Path of the stored JSON file
+        """
+        with open(path, "rb") as f:
+            content = f.read()
+        status = "complete" if content else "incomplete"
+        checksum = hashlib.sha256(content).hexdigest()
+        self._upsert(asin, start_date, end_date, status, len(content), checksum)
+
+    def record_failure(self, asin: str, start_date: str, end_date: str):
+        """
+        Record a failed fetch so the ASIN is retried on the next run
+
+        Args:
+            asin: The product ASIN
+            start_date: First date of the requested window
+            end_date: Last date of the requested window
+        """
+        self._upsert(asin, start_date, end_date, "failed")
+
+    def record_range(self, asin: str, start_date: str, end_date: str):
+        """
+        Record a date range requested from the API, with or without sales data
+
+        Args:
+            asin: The product ASIN
+            start_date: First date of the requested range
+            end_date: Last date of the requested range
+        """
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO fetched_ranges VALUES (?, ?, ?)",
+                (asin, start_date, end_date),
+            )
+
+    def fetched_ranges(
+        self, asin: str, start_date: str, end_date: str
+    ) -> List[Tuple[str, str]]:
+        """
+        Return the requested ranges of an ASIN overlapping start_date..end_date
+
+        Args:
+            asin: The product ASIN
+            start_date: First date of the window
+            end_date: Last date of the window
+
+        Returns:
+            List of (start_date, end_date) ranges
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                """
+                SELECT start_date, end_date FROM fetched_ranges
+                WHERE asin = ? AND start_date <= ? AND end_date >= ?
+                ORDER BY start_date
+                """,
+                (asin, end_date, start_date),
+            ).fetchall()
+        return [tuple(row) for row in rows]
+
+    def is_complete(self, asin: str, end_date: str = None) -> bool:
+        """
+        Check whether an ASIN has a complete file covering up to end_date
+
+        Args:
+            asin: The product ASIN
+            end_date: Date the stored window must reach (default: any window)
+
+        Returns:
+            True if the ASIN does not need to be fetched again
+        """
+        row = self.conn.execute(
+            "SELECT status, end_date FROM asins WHERE asin = ?", (asin,)
+        ).fetchone()
+        if row is None or row[0] != "complete":
+            return False
+        return end_date is None or (row[1] or "") >= end_date
+
+    def complete_asins(self, end_date: str = None) -> Set[str]:
+        """
+        Return the ASINs with a complete file covering up to end_date
+
+        Args:
+            end_date: Date the stored window must reach (default: any window)
+
+        Returns:
+            Set of ASINs
+        """
+        rows = self.conn.execute(
+            "SELECT asin FROM asins WHERE status = 'complete' AND end_date >= ?",
+            (end_date or "",),
+        )
+        return {row[0] for row in rows}
+
+    def stale_since(self, date: str) -> List[str]:
+        """
+        Return the ASINs that are incomplete or whose window ends before date
+
+        Args:
+            date: ISO date the stored window must reach
+
+        Returns:
+            List of ASINs to refetch
+        """
+        rows = self.conn.execute(
+            """
+            SELECT asin FROM asins
+            WHERE status != 'complete' OR end_date IS NULL OR end_date < ?
+            ORDER BY asin
+            """,
+            (date,),
+        )
+        return [row[0] for row in rows]
+
+    def bootstrap(self, directory: str = "data/junglescout"):
+        """
+        Index stored files that are not in the manifest yet
+
+        The fetch window is read from each file's daily data, files without
+        readable data are marked incomplete.
+
+        Args:
+            directory: Folder holding the {asin}.json files
+        """
+        known = {row[0] for row in self.conn.execute("SELECT asin FROM asins")}
+        for name in os.listdir(directory):
+            asin, ext = os.path.splitext(name)
+            if ext != ".json" or asin in known:
+                continue
+
+            path = os.path.join(directory, name)
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+                dates = [
+                    item["date"]
+                    for item in data["data"][0]["attributes"]["data"]
+                ]
+                self.record(asin, min(dates), max(dates), path)
+            except (ValueError, KeyError, IndexError, TypeError):
+                self._upsert(asin, None, None, "incomplete", os.path.getsize(path))
@@ -0,0 +1,221 @@
+import json
+import os
+import threading
+from datetime import date
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+
+# Schema of the normalized daily sales rows
+DAILY_SALES_SCHEMA = pa.schema(
+    [
+        ("asin", pa.string()),
+        ("date", pa.date32()),
+        ("estimated_units_sold", pa.int64()),
+        ("last_known_price", pa.float64()),
+    ]
+)
+
+
+def normalize_sales_estimates(data: Dict[str, Any]) -> List[Tuple]:
+    """
+    Flatten a sales_estimates response into (asin, date, units, price) rows
+
+    Args:
+        data: The model_dump() of a sales_estimates response
+
+    Returns:
+        List of daily sales rows
+    """
+    rows = []
+    for result in data.get("data") or []:
+        attributes = result.get("attributes", {})
+        for item in attributes.get("data", []):
+            rows.append(
+                (
+                    attributes["asin"],
+                    date.fromisoformat(item["date"]),
+                    item["estimated_units_sold"],
+                    item.get("last_known_price"),
+                )
+            )
+    return rows
+
+
+class SalesStore:
+    """
+    DuckDB store of JungleScout daily sales estimates, one row per ASIN and day
+    """
+
+    def __init__(self, path: str = "data/junglescout_sales.duckdb"):
+        """
+        Open or create the store
+
+        Args:
+            path: Path of the DuckDB file
+        """
+        self.lock = threading.Lock()
+        self.conn = duckdb.connect(path)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS daily_sales (
+                asin VARCHAR,
+                date DATE,
+                estimated_units_sold BIGINT,
+                last_known_price DOUBLE,
+                PRIMARY KEY (asin, date)
+            )
+            """
+        )
+
+    def append(self, rows: Iterable[Tuple]) -> int:
+        """
+        Insert daily sales rows, replacing days already stored for an ASIN
+
+        Args:
+            rows: (asin, date, estimated_units_sold, last_known_price) tuples
+
+        Returns:
+            Number of rows written
+        """
+        columns = list(zip(*rows)) or [[] for _ in DAILY_SALES_SCHEMA]
+        table = pa.table(
+            [
+                pa.array(values, field.type)
+                for values, field in zip(columns, DAILY_SALES_SCHEMA)
+            ],
+            schema=DAILY_SALES_SCHEMA,
+        )
+        with self.lock:
+            self.conn.register("new_sales", table)
+            try:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO daily_sales SELECT * FROM new_sales"
+                )
+            finally:
+                self.conn.unregister("new_sales")
+        return table.num_rows
+
+    def daily_sales(
+        self, asins: List[str] = None, start_date: str = None, end_date: str = None
+    ) -> pd.DataFrame:
+        """
+        Load the daily sales of the given ASINs, or of every ASIN
+
+        Args:
+            asins: ASINs to load (default: all)
+            start_date: First date to load (default: no lower bound)
+            end_date: Last date to load (default: no upper bound)
+
+        Returns:
+            DataFrame ordered by ASIN and date
+        """
+        conditions = ["TRUE"]
+        params = []
+        if asins is not None:
+            conditions.append("asin IN (SELECT unnest(?))")
+            params.append(list(asins))
+        if start_date is not None:
+            conditions.append("date >= ?::DATE")
+            params.append(start_date)
+        if end_date is not None:
+            conditions.append("date <= ?::DATE")
+            params.append(end_date)
+        query = f"SELECT * FROM daily_sales WHERE {' AND '.join(conditions)}"
+        with self.lock:
+            return self.conn.execute(query + " ORDER BY asin, date", params).fetchdf()
+
+    def stored_dates(self, asin: str, start_date: str, end_date: str) -> Set[date]:
+        """
+        Return the dates between start_date and end_date stored for an ASIN
+
+        Args:
+            asin: The product ASIN
+            start_date: First date of the window
+            end_date: Last date of the window
+
+        Returns:
+            Set of stored dates
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT date FROM daily_sales "
+                "WHERE asin = ? AND date BETWEEN ?::DATE AND ?::DATE",
+                [asin, start_date, end_date],
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def totals(
+        self, asins: List[str] = None, start_date: str = None, end_date: str = None
+    ) -> pd.DataFrame:
+        """
+        Sum units sold and count days with sales per ASIN in a single scan
+
+        Args:
+            asins: ASINs to aggregate (default: all)
+            start_date: First date to aggregate (default: no lower bound)
+            end_date: Last date to aggregate (default: no upper bound)
+
+        Returns:
+            DataFrame with asin, sale_volume and daily_count columns
+        """
+        conditions = ["TRUE"]
+        params = []
+        if asins is not None:
+            conditions.append("asin IN (SELECT unnest(?))")
+            params.append(list(asins))
+        if start_date is not None:
+            conditions.append("date >= ?::DATE")
+            params.append(start_date)
+        if end_date is not None:
+            conditions.append("date <= ?::DATE")
+            params.append(end_date)
+        query = f"""
+            SELECT
+                asin,
+                coalesce(sum(estimated_units_sold), 0)::BIGINT AS sale_volume,
+                count(*) FILTER (WHERE estimated_units_sold > 0) AS daily_count
+            FROM daily_sales
+            WHERE {' AND '.join(conditions)}
+            GROUP BY asin
+            ORDER BY asin
+        """
+        with self.lock:
+            return self.conn.execute(query, params).fetchdf()
+
+    def is_empty(self) -> bool:
+        """
+        Check whether no sales have been stored yet
+        """
+        with self.lock:
+            return self.conn.execute("SELECT count(*) FROM daily_sales").fetchone()[0] == 0
+
+    def import_json_dir(self, directory: str = "data/junglescout") -> int:
+        """
+        Load every stored sales estimate JSON file into the store
+
+        Unreadable or truncated files are skipped, they are fetched again on
+        the next run.
+
+        Args:
+            directory: Folder holding the {asin}.json files
+
+        Returns:
+            Number of rows written
+        """
+        rows = []
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if not name.endswith(".json") or os.path.getsize(path) == 0:
+                continue
+            try:
+                with open(path) as f:
+                    rows.extend(normalize_sales_estimates(json.load(f)))
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                print(f"Skipping unreadable sales file {path}: {e}")
+        return self.append(rows)
+
+    def close(self):
+        self.conn.close()